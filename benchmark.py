@@ -0,0 +1,237 @@
+"""Replay a clip through the full VideoCamera pipeline and report performance.
+
+Runs get_frame() on every frame of a video file, an image folder or a
+synthetic scene, and reports fps, per-stage latency percentiles, CPU and
+peak RSS. The JSON report can be compared against a previous one to catch
+regressions between releases.
+
+    python benchmark.py sample.mp4 --out benchmark.json
+    python benchmark.py synthetic:1920x1080 --stub --baseline benchmark.json
+"""
+import argparse
+import contextlib
+import json
+import sys
+import time
+from collections import defaultdict
+
+import numpy as np
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+import config
+from camera import VideoCamera
+from models import SharedModels
+from sources import open_source
+from stream import DEFAULT_PROFILE, STREAM_PROFILES
+
+STAGES = ('capture', 'motion', 'tamper', 'weapon', 'person', 'face', 'draw', 'encode', 'lock_wait',
+          'frame_age', 'alarm_latency')
+
+
+class StageTimer(object):
+    """Collects raw per-stage latencies (seconds) and counters for VideoCamera.stage_timer."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.counters = defaultdict(int)
+
+    @contextlib.contextmanager
+    def time(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples[stage].append(time.perf_counter() - start)
+
+    def observe(self, stage, seconds):
+        self.samples[stage].append(seconds)
+
+    def count(self, name, value=1):
+        self.counters[name] += value
+
+    def clear(self):
+        self.samples.clear()
+        self.counters.clear()
+
+
+def summarize(samples):
+    ms = np.array(samples) * 1000
+    return {
+        'count': len(samples),
+        'mean_ms': float(ms.mean()),
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'max_ms': float(ms.max()),
+    }
+
+
+def cpu_seconds():
+    if resource is None:
+        return time.process_time()
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024.0 * 1024.0) if sys.platform == 'darwin' else peak / 1024.0
+
+
+def current_rss_mb():
+    """Resident set size right now (Linux only), for leak checks."""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return pages * resource.getpagesize() / (1024.0 * 1024.0)
+
+
+def add_zones(camera, count):
+    """Split the frame into count side-by-side zones."""
+    width, height = camera.frame_size
+    step = width // count
+    for i in range(count):
+        camera.add_roi(i * step, 0, step, height, f"Bench {i + 1}")
+
+
+def run(camera, frames, warmup):
+    timer = StageTimer()
+    camera.stage_timer = timer
+    for _ in range(warmup):
+        if camera.get_frame() is None:
+            break
+    timer.clear()
+
+    rss_start = current_rss_mb()
+    cpu_start = cpu_seconds()
+    wall_start = time.perf_counter()
+    frame_times = []
+    while len(frame_times) < frames:
+        start = time.perf_counter()
+        if camera.get_frame() is None:
+            break
+        frame_times.append(time.perf_counter() - start)
+    wall = time.perf_counter() - wall_start
+    cpu = cpu_seconds() - cpu_start
+    rss_end = current_rss_mb()
+
+    report = {
+        'frames': len(frame_times),
+        'wall_seconds': wall,
+        'fps': len(frame_times) / wall if wall else 0.0,
+        'cpu_seconds': cpu,
+        'cpu_percent': 100.0 * cpu / wall if wall else 0.0,
+        'peak_rss_mb': peak_rss_mb(),
+        'rss_growth_mb': rss_end - rss_start if rss_start is not None and rss_end is not None else None,
+        'counters': dict(timer.counters),
+        'stages': {},
+    }
+    if frame_times:
+        report['stages']['frame'] = summarize(frame_times)
+    for stage in STAGES:
+        if timer.samples.get(stage):
+            report['stages'][stage] = summarize(timer.samples[stage])
+    return report
+
+
+def regressions(report, baseline, tolerance):
+    """Human readable list of everything more than tolerance worse than the baseline."""
+    found = []
+    if baseline.get('fps') and report['fps'] < baseline['fps'] * (1 - tolerance):
+        found.append(f"fps {report['fps']:.1f} < baseline {baseline['fps']:.1f}")
+    for stage, stats in report['stages'].items():
+        old = baseline.get('stages', {}).get(stage)
+        if old and stats['p95_ms'] > old['p95_ms'] * (1 + tolerance):
+            found.append(f"{stage} p95 {stats['p95_ms']:.2f} ms > baseline {old['p95_ms']:.2f} ms")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('source', help="Video file, image folder or synthetic[:WIDTHxHEIGHT]")
+    parser.add_argument('--frames', type=int, default=300, help="Frames to measure (fewer if the clip ends)")
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--loop', action='store_true', help="Loop files/folders until --frames is reached")
+    parser.add_argument('--stub', action='store_true', help="Use weight-free stub detectors")
+    parser.add_argument('--stub-latency-ms', type=float, default=0.0, help="Simulated inference time per image")
+    parser.add_argument('--zones', type=int, default=1, help="Side-by-side zones covering the frame")
+    parser.add_argument('--no-away', action='store_true', help="Leave Away Mode off (no person detection)")
+    parser.add_argument('--no-weapons', action='store_true', help="Leave weapon detection off")
+    parser.add_argument('--profile', default=DEFAULT_PROFILE, help="Stream profile to encode ('' for none)")
+    parser.add_argument('--record', action='store_true', help="Keep event clip recording on")
+    parser.add_argument('--out', default='benchmark.json')
+    parser.add_argument('--baseline', help="Previous report; exit 1 on regressions")
+    parser.add_argument('--tolerance', type=float, default=0.15, help="Allowed slowdown vs. the baseline")
+    parser.add_argument('--max-rss-growth-mb', type=float, help="Exit 1 if RSS grows more than this (soak runs)")
+    args = parser.parse_args()
+    if args.profile and args.profile not in STREAM_PROFILES:
+        parser.error(f"Unknown stream profile: {args.profile}")
+
+    source = open_source(args.source, loop=args.loop)
+    if not source.isOpened():
+        parser.error(f"Could not open {args.source}")
+
+    models = SharedModels(backend='stub' if args.stub else None)
+    if args.stub:
+        for model in models.model_person.models + models.model_weapon.models:
+            model.latency = args.stub_latency_ms / 1000.0
+    camera = VideoCamera('bench', source, models=models, record_clips=args.record)
+
+    # The first frame tells us the resolution the zones are laid out in
+    if camera.get_frame() is None:
+        parser.error(f"No frames in {args.source}")
+    add_zones(camera, max(1, args.zones))
+    camera.toggle_away_mode(not args.no_away)
+    camera.toggle_weapon_detection(not args.no_weapons)
+    if args.profile:
+        camera.subscribe(args.profile)
+
+    report = run(camera, args.frames, args.warmup)
+    report.update({
+        'source': args.source,
+        'frame_size': list(camera.frame_size),
+        'backend': models.model_person.inference_backend,
+        'zones': args.zones,
+        'away_mode': not args.no_away,
+        'weapon_check': not args.no_weapons,
+        'weapon_scan': config.WEAPON_SCAN,
+        'profile': args.profile,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    })
+    camera.stop()
+    models.shutdown()
+
+    print(f"{report['frames']} frames at {report['frame_size'][0]}x{report['frame_size'][1]}: "
+          f"{report['fps']:.1f} fps, CPU {report['cpu_percent']:.0f}%, peak RSS {report['peak_rss_mb'] or 0:.0f} MB")
+    print(f"{'stage':<10}{'count':>8}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, stats in report['stages'].items():
+        print(f"{stage:<10}{stats['count']:>8}{stats['mean_ms']:>10.2f}{stats['p50_ms']:>10.2f}"
+              f"{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}")
+
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.out}")
+
+    failed = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            failed += regressions(report, json.load(f), args.tolerance)
+    growth = report['rss_growth_mb']
+    if args.max_rss_growth_mb is not None and growth is not None and growth > args.max_rss_growth_mb:
+        failed.append(f"RSS grew {growth:.1f} MB (limit {args.max_rss_growth_mb:.1f} MB)")
+    for message in failed:
+        print(f"REGRESSION: {message}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,31 +1,80 @@
+import contextlib
 import datetime
 import cv2
 import threading
 import time
 import numpy as np
 import uuid
-import os
-import face_recognition
-from ultralytics import YOLO
+from collections import deque, namedtuple
+from config import (ANALYSIS_WIDTH, CAPTURE_THREADED, CLIP_PROFILE, EVENTS_ENABLED, METRICS_ENABLED, MODEL_IMGSZ, RECORD_CLIPS,
+                    WEAPON_CROP_IMGSZ, WEAPON_PERSON_PAD, WEAPON_SCAN, WEAPON_TILE, WEAPON_TILE_SECONDS)
+from events import EventStore
+from metrics import CameraMetrics
+from models import SharedModels
+from recorder import ClipRecorder, ClipWriter
+from scheduler import InferenceScheduler
+from sources import open_source
+from stream import DEFAULT_PROFILE, StreamHub
+from tracker import PersonTracker
+from zones import Zone, box_intersection, dedupe_boxes, integral_sum, merge_rects, pad_box, tile_rects
+
+# Snapshot of user-controlled settings. rois is a tuple of dicts:
+# {'id': str, 'name': str, 'rect': (x, y, w, h)}, plus 'points': [[x, y], ...]
+# for polygon zones (rect is then their bounding rect)
+CameraConfig = namedtuple('CameraConfig', ['away_mode', 'night_mode_enabled', 'weapon_check_enabled', 'rois'])
+
+MAX_WEAPON_BOXES = 32
+
+# Returned by VideoCamera.timed() when no stage timer is attached
+_NO_TIMING = contextlib.nullcontext()
+
+
+class _TimedLock(object):
+    """Acquires a lock, recording the wait as the 'lock_wait' stage."""
+
+    def __init__(self, lock, stage_timer):
+        self.lock = lock
+        self.stage_timer = stage_timer
+
+    def __enter__(self):
+        start = time.perf_counter()
+        self.lock.acquire()
+        self.stage_timer.observe('lock_wait', time.perf_counter() - start)
+
+    def __exit__(self, *exc):
+        self.lock.release()
+
+
+def is_night_time(now=None):
+    """Night Mode window: 12 AM - 5 AM local time."""
+    now = now or datetime.datetime.now()
+    return 0 <= now.hour < 5
+
 
 class VideoCamera(object):
-    def __init__(self):
-        # Using 0 for the default camera.
-        self.video = cv2.VideoCapture(0)
+    def __init__(self, cam_id="default", source=0, models=None, clip_writer=None, record_clips=None, events=None):
+        # Using 0 for the default camera. source may also be a file, an image
+        # folder, "synthetic" or any object with the VideoCapture read() interface.
+        self.cam_id = cam_id
+        self.source = source
+        # Live cameras/streams are read on a grab thread that keeps only the newest frame
+        self.video = open_source(source, threaded=CAPTURE_THREADED) if isinstance(source, (int, str)) else source
         if not self.video.isOpened():
-            print("Warning: Could not open video device 0. Please check camera permissions.")
+            print(f"Warning: Could not open video source {source} ({cam_id}). Please check camera permissions.")
+        # Guards the alarm flags below. Held only for short state
+        # transitions, never while a model is running.
         self.lock = threading.Lock()
         
         # Global state
-        self.rois = [] # List of dicts: {'id': str, 'name': str, 'rect': (x, y, w, h)}
-        self.away_mode = False
+        # User settings live in an immutable snapshot that is swapped on
+        # write, so the pipeline can read it without taking the lock.
+        self.config = CameraConfig(away_mode=False, night_mode_enabled=False, weapon_check_enabled=False, rois=())
         self.alarm_active = False
         self.dismissed_until = 0 # Timestamp until when alarm is dismissed
         
         # Tamper Detection State
         self.tamper_start_time = None
         self.tamper_active = False
-        self.night_mode_enabled = False # New Feature
         
         # High Confidence Person Detection State
         self.person_detection_start_time = None
@@ -33,104 +82,223 @@ class VideoCamera(object):
         
         # Weapon Detection State
         self.weapon_active = False
-        self.weapon_check_enabled = False # Default: OFF. User must enable it.
         self.weapon_detection_start_time = None
         self.last_weapon_seen_time = 0
-        self.confirmed_weapon_boxes = []
+        self.confirmed_weapon_boxes = deque(maxlen=MAX_WEAPON_BOXES) # most recent boxes only
+        self.last_weapon_boxes = [] # hits of the last scan that found anything
+        self.last_weapon_tile = 0 # round-robin sweep, see weapon_inputs()
+        self.sweep_index = 0
         # Performance & Motion
         self.frame_count = 0
         self.last_detections = [] # [(rect, type)] type='person'
-        self.average_frame = None # For motion detection
-        
-        # Models
-        print("Loading Person Detection Model (YOLOv8 Small)...")
-        # Upgraded to 's' model for better accuracy (less false positives like pillows)
-        self.model_person = YOLO('yolov8s.pt')
+        self.average_frame = None # For motion detection (float32, updated in place)
+        # Preallocated per-frame buffers (grayscale, motion mask, ...), see scratch()
+        self.scratch_buffers = {}
+        self.capture_buffer = None
+        self.analysis_scale = 1.0 # analysis frame pixels per full-resolution pixel
+        # Rasterized zones (zones.Zone), rebuilt when the ROIs or the frame size change
+        self.zone_cache = None
+        self.scheduler = InferenceScheduler()
+        # Track IDs let face verdicts be cached per person
+        self.person_tracker = PersonTracker()
         
-        print("Loading Weapon Detection Model (Custom)...")
-        # Custom model for Handgun, Knife, Dagger, Axe, Hammer
-        self.model_weapon = YOLO('my_final_weapon_model.pt')
-        
-        # --- Face Recognition Setup ---
-        self.known_face_encodings = []
-        self.known_face_names = []
-        self.load_known_faces()
-        
- 
+        # Models and face gallery are shared by all cameras
+        self.models = models or SharedModels()
 
+        # --- Event Clips ---
+        # Pre-alarm ring buffer; finished clips go to the (shared) writer thread
+        self.recorder = None
+        if RECORD_CLIPS if record_clips is None else record_clips:
+            self.recorder = ClipRecorder(cam_id, clip_writer or ClipWriter())
+        self.previous_alarms = {}
+        # Wall-clock capture time of the frame being processed
+        self.frame_time = None
+        # Event history (events.EventStore, shared by all cameras); None = not recorded
+        self.events = events
 
-    def load_known_faces(self):
-        """Load known faces from face_dataset folder."""
-        print("Loading Known Faces...")
-        dataset_path = "face_dataset"
-        if not os.path.exists(dataset_path):
-            print(f"Warning: {dataset_path} not found.")
-            return
+        # --- Status push ---
+        # Bumped (and subscribers woken) only when the status actually changes
+        self.night_time = is_night_time()
+        self.frame_size = (0, 0)
+        self.status_changed = threading.Condition(self.lock)
+        self.status_version = 0
+        self.status = self._build_status()
+        self.status_rois = self.config.rois
 
-        for person_name in os.listdir(dataset_path):
-            person_dir = os.path.join(dataset_path, person_name)
-            if not os.path.isdir(person_dir):
-                continue
-                
-            for image_name in os.listdir(person_dir):
-                if image_name.startswith('.'): continue
-                image_path = os.path.join(person_dir, image_name)
-                try:
-                    image = face_recognition.load_image_file(image_path)
-                    encodings = face_recognition.face_encodings(image)
-                    if encodings:
-                        self.known_face_encodings.append(encodings[0])
-                        self.known_face_names.append(person_name)
-                        print(f"Loaded: {person_name} ({image_name})")
-                except Exception as e:
-                    print(f"Error loading {image_path}: {e}")
-        print(f"Total Known Faces: {len(self.known_face_names)}")
+        # --- Streaming ---
+        # A single pipeline thread captures, detects and encodes;
+        # every viewer just waits on its stream profile for the next frame.
+        self.streams = StreamHub()
+        self.running = False
+        self.pipeline_thread = None
+
+        # Optional per-stage timer and counters (metrics.CameraMetrics, or
+        # the benchmark's): time(stage), observe(stage, seconds) and
+        # count(name). None costs nothing.
+        self.stage_timer = None
+
+    def timed(self, stage):
+        """Context manager timing one pipeline stage, if a stage timer is attached."""
+        if self.stage_timer is None:
+            return _NO_TIMING
+        return self.stage_timer.time(stage)
+
+    def count(self, name, value=1):
+        if self.stage_timer is not None:
+            self.stage_timer.count(name, value)
+
+    def pipeline_lock(self):
+        """self.lock for the pipeline thread, timing the wait when a stage timer is attached."""
+        if self.stage_timer is None:
+            return self.lock
+        return _TimedLock(self.lock, self.stage_timer)
+
+    def log_event(self, event_type, **detail):
+        """Append an event to the history. Only queues it, never blocks."""
+        if self.events is not None:
+            self.events.record(self.cam_id, event_type, detail)
+
+    def forget_identities(self):
+        """Drop cached face verdicts, e.g. after the face gallery was reloaded."""
+        for track in list(self.person_tracker.tracks):
+            track.checked_at = None
 
     def __del__(self):
+        self.stop()
         self.video.release()
 
+    def start(self):
+        """Start the background capture/detect/encode pipeline."""
+        if self.pipeline_thread is not None:
+            return
+        self.running = True
+        self.pipeline_thread = threading.Thread(target=self._pipeline_loop, name=f"camera-{self.cam_id}", daemon=True)
+        self.pipeline_thread.start()
+
+    def stop(self):
+        """Stop the pipeline thread and release any waiting viewers."""
+        self.running = False
+        self.streams.close()
+        if self.pipeline_thread is not None and self.pipeline_thread is not threading.current_thread():
+            self.pipeline_thread.join(timeout=2)
+        self.pipeline_thread = None
+
+    def _pipeline_loop(self):
+        while self.running:
+            try:
+                frame = self.get_frame()
+            except Exception as e:
+                print(f"Pipeline error ({self.cam_id}): {e}")
+                self.count('pipeline_errors')
+                frame = None
+            if frame is None:
+                time.sleep(0.1)
+
+    def wait_for_frame(self, last_seq=0, timeout=1.0, profile=DEFAULT_PROFILE):
+        """Block until a frame newer than last_seq is available. Returns (seq, jpeg_bytes or None).
+
+        Only frames of profiles with a subscriber are encoded; see subscribe().
+        seq is None once the camera has been stopped.
+        """
+        return self.streams.broadcasters[profile].wait(last_seq, timeout)
+
+    def subscribe(self, profile=DEFAULT_PROFILE):
+        """Start encoding a stream profile for a viewer. Raises KeyError for unknown profiles."""
+        return self.streams.subscribe(profile)
+
+    def unsubscribe(self, profile=DEFAULT_PROFILE):
+        self.streams.unsubscribe(profile)
+
+    # Read-only views of the current config snapshot
+    @property
+    def rois(self):
+        return self.config.rois
+
+    @property
+    def away_mode(self):
+        return self.config.away_mode
+
+    @property
+    def night_mode_enabled(self):
+        return self.config.night_mode_enabled
+
+    @property
+    def weapon_check_enabled(self):
+        return self.config.weapon_check_enabled
+
     def add_roi(self, x, y, w, h, name="Zone"):
         """Add a new Region of Interest."""
+        roi = {
+            'id': str(uuid.uuid4()),
+            'name': name,
+            'rect': (int(x), int(y), int(w), int(h))
+        }
+        return self._add_roi(roi)
+
+    def add_polygon_roi(self, points, name="Zone"):
+        """Add a polygon Region of Interest from [[x, y], ...] (at least 3 points, inside the frame)."""
+        points = [(int(x), int(y)) for x, y in points]
+        if len(points) < 3:
+            raise ValueError("A polygon zone needs at least 3 points")
+        width, height = self.frame_size
+        if width and height and any(not (0 <= x <= width and 0 <= y <= height) for x, y in points):
+            raise ValueError(f"Polygon points must lie inside the {width}x{height} frame")
+        roi = {
+            'id': str(uuid.uuid4()),
+            'name': name,
+            'rect': tuple(int(v) for v in cv2.boundingRect(np.array(points, dtype=np.int32))),
+            'points': points
+        }
+        return self._add_roi(roi)
+
+    def _add_roi(self, roi):
         with self.lock:
-            roi_id = str(uuid.uuid4())
-            self.rois.append({
-                'id': roi_id,
-                'name': name,
-                'rect': (int(x), int(y), int(w), int(h))
-            })
-            print(f"Added ROI: {name} {self.rois[-1]}")
-            return roi_id
+            self.config = self.config._replace(rois=self.config.rois + (roi,))
+            self.zone_cache = None
+            self._publish_status()
+        print(f"Added ROI: {roi['name']} {roi}")
+        self.log_event('zone', action='add', id=roi['id'], name=roi['name'])
+        return roi['id']
 
     def delete_roi(self, roi_id):
         """Delete an ROI by ID."""
         with self.lock:
-            self.rois = [r for r in self.rois if r['id'] != roi_id]
-            print(f"Deleted ROI: {roi_id}")
+            rois = tuple(r for r in self.config.rois if r['id'] != roi_id)
+            self.config = self.config._replace(rois=rois)
+            self.zone_cache = None
+            self._publish_status()
+        print(f"Deleted ROI: {roi_id}")
+        self.log_event('zone', action='delete', id=roi_id)
 
     def get_rois(self):
-        with self.lock:
-            return self.rois
+        return list(self.config.rois)
 
     def toggle_away_mode(self, status):
         """Enable or disable Away Mode."""
         with self.lock:
-            self.away_mode = status
+            self.config = self.config._replace(away_mode=status)
             self.alarm_active = False
             self.weapon_active = False
-            print(f"Away Mode: {self.away_mode}")
+            self._publish_status()
+        print(f"Away Mode: {status}")
+        self.log_event('mode', mode='away', enabled=bool(status))
 
     def toggle_night_mode(self, status):
         """Enable or disable Night Mode (12 AM - 5 AM)."""
         with self.lock:
-            self.night_mode_enabled = status
-            print(f"Night Mode: {self.night_mode_enabled}")
+            self.config = self.config._replace(night_mode_enabled=status)
+            self._publish_status()
+        print(f"Night Mode: {status}")
+        self.log_event('mode', mode='night', enabled=bool(status))
 
     def toggle_weapon_detection(self, status):
         """Enable or disable Specific Weapon Detection."""
         with self.lock:
-            self.weapon_check_enabled = status
+            self.config = self.config._replace(weapon_check_enabled=status)
             self.weapon_active = False # Reset alert if toggled off
-            print(f"Weapon Detection Enabled: {self.weapon_check_enabled}")
+            self._publish_status()
+        print(f"Weapon Detection Enabled: {status}")
+        self.log_event('mode', mode='weapon_check', enabled=bool(status))
 
     def dismiss_alert(self):
         with self.lock:
@@ -139,34 +307,56 @@ class VideoCamera(object):
             self.weapon_active = False
             # Prevent re-triggering for 5 seconds
             self.dismissed_until = time.time() + 5
+            self._publish_status()
+        self.log_event('dismiss')
 
     def reset_alarm(self):
         with self.lock:
             self.alarm_active = False
             self.tamper_active = False
+            self._publish_status()
+
+    def _build_status(self):
+        # Check if night mode is currently ACTIVE (night window cached per frame)
+        config = self.config
+        return {
+            "away_mode": config.away_mode,
+            "night_mode_enabled": config.night_mode_enabled,
+            "night_mode_active": config.night_mode_enabled and self.night_time,
+            "alarm_active": self.alarm_active,
+            "tamper_active": self.tamper_active,
+            "weapon_active": self.weapon_active,
+            "weapon_check_enabled": config.weapon_check_enabled,
+            "roi_count": len(config.rois),
+            # Capture resolution; ROI coordinates are in this space
+            "frame_width": self.frame_size[0],
+            "frame_height": self.frame_size[1]
+        }
+
+    def _publish_status(self):
+        """Wake status subscribers if anything visible changed. Caller holds self.lock."""
+        status = self._build_status()
+        rois = self.config.rois
+        if status != self.status or rois is not self.status_rois:
+            self.status = status
+            self.status_rois = rois
+            self.status_version += 1
+            self.status_changed.notify_all()
 
     def get_status(self):
         with self.lock:
-            # Check if night mode is currently ACTIVE
-            current_hour = datetime.datetime.now().hour
-            is_night_time = 0 <= current_hour < 5
-            night_mode_active = self.night_mode_enabled and is_night_time
-
-            return {
-                "away_mode": self.away_mode,
-                "night_mode_enabled": self.night_mode_enabled,
-                "night_mode_active": night_mode_active,
-                "alarm_active": self.alarm_active,
-                "tamper_active": self.tamper_active,
-                "weapon_active": self.weapon_active,
-                "weapon_check_enabled": self.weapon_check_enabled,
-                "roi_count": len(self.rois)
-            }
-
-    def check_tampering(self, image):
-        # Convert to grayscale
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        
+            return dict(self.status)
+
+    def wait_for_status(self, last_version=0, timeout=15.0):
+        """Block until the status changes after last_version.
+
+        Returns (version, status, rois); version == last_version on timeout.
+        """
+        with self.lock:
+            self.status_changed.wait_for(lambda: self.status_version != last_version, timeout)
+            return self.status_version, dict(self.status), list(self.status_rois)
+
+    def check_tampering(self, gray):
         # Calculate mean and standard deviation
         mean, std_dev = cv2.meanStdDev(gray)
         mean_val = mean[0][0]
@@ -179,24 +369,39 @@ class VideoCamera(object):
         
         current_time = time.time()
         
-        if is_tampered:
-            if self.tamper_start_time is None:
-                self.tamper_start_time = current_time
-            elif current_time - self.tamper_start_time > 5: # 5 Seconds Persistence
-                # Only activate if we haven't recently dismissed it
-                if current_time > self.dismissed_until:
-                    self.tamper_active = True
-        else:
-            self.tamper_start_time = None
-            if not self.alarm_active and not self.weapon_active:
-                if current_time > self.dismissed_until:
-                     self.tamper_active = False
+        with self.pipeline_lock():
+            if is_tampered:
+                if self.tamper_start_time is None:
+                    self.tamper_start_time = current_time
+                elif current_time - self.tamper_start_time > 5: # 5 Seconds Persistence
+                    # Only activate if we haven't recently dismissed it
+                    if current_time > self.dismissed_until:
+                        self.tamper_active = True
+            else:
+                self.tamper_start_time = None
+                if not self.alarm_active and not self.weapon_active:
+                    if current_time > self.dismissed_until:
+                         self.tamper_active = False
+            self._publish_status()
+
+    def scratch(self, name, shape, dtype=np.uint8):
+        """Per-frame work buffer, reused across frames while the shape stays the same."""
+        buf = self.scratch_buffers.get(name)
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            buf = np.empty(shape, dtype=dtype)
+            self.scratch_buffers[name] = buf
+        return buf
 
     def get_motion_mask(self, gray_frame):
-        """Compute motion mask between current and average frame."""
-        if self.average_frame is None:
-            self.average_frame = gray_frame.copy().astype("float")
-            return np.zeros_like(gray_frame)
+        """Compute motion mask between current and average frame.
+
+        The returned mask is a scratch buffer, only valid until the next frame.
+        """
+        thresh = self.scratch('motion_mask', gray_frame.shape)
+        if self.average_frame is None or self.average_frame.shape != gray_frame.shape:
+            self.average_frame = gray_frame.astype(np.float32)
+            thresh.fill(0)
+            return thresh
         
         # Accumulate weighted average
         # Alpha 0.02 means background updates slowly (good for detecting static-ish people)
@@ -204,16 +409,38 @@ class VideoCamera(object):
         cv2.accumulateWeighted(gray_frame, self.average_frame, 0.02)
         
         # Compute difference
-        frame_diff = cv2.absdiff(gray_frame, cv2.convertScaleAbs(self.average_frame))
+        background = cv2.convertScaleAbs(self.average_frame, dst=self.scratch('background', gray_frame.shape))
+        frame_diff = cv2.absdiff(gray_frame, background, dst=self.scratch('frame_diff', gray_frame.shape))
         
-        # Threshold to get motion
-        _, thresh = cv2.threshold(frame_diff, 25, 255, cv2.THRESH_BINARY)
+        # Threshold to get motion (0/1, so its integral cannot overflow int32)
+        cv2.threshold(frame_diff, 25, 1, cv2.THRESH_BINARY, dst=thresh)
         return thresh
 
-    def is_box_moving(self, box_coords, motion_mask, threshold=0.01):
-        """Check if a bounding box area has significant motion."""
+    def get_zones(self, rois, frame_size, analysis_shape):
+        """Zones for an ROI snapshot, rasterized once and reused until the ROIs or resolution change."""
+        # The analysis shape alone is not enough: 1920x1080 and 1280x720 both analyse at 640x360
+        cache = self.zone_cache
+        if cache is None or cache[0] is not rois or cache[1] != frame_size or cache[2] != analysis_shape:
+            analysis_size = (analysis_shape[1], analysis_shape[0])
+            zones = [Zone(roi, frame_size, analysis_size, self.analysis_scale) for roi in rois]
+            cache = self.zone_cache = (rois, frame_size, analysis_shape, zones)
+        return cache[3]
+
+    def to_analysis(self, box_coords):
+        """Map a full-resolution box onto the (downscaled) analysis frame."""
+        scale = self.analysis_scale
+        if scale == 1.0:
+            return box_coords
         x1, y1, x2, y2 = box_coords
-        h, w = motion_mask.shape
+        return (int(x1 * scale), int(y1 * scale), int(np.ceil(x2 * scale)), int(np.ceil(y2 * scale)))
+
+    def is_box_moving(self, box_coords, motion_integral, threshold=0.01):
+        """Check if a bounding box area (full-resolution coordinates) has significant motion.
+
+        O(1): four lookups in the integral of the motion mask.
+        """
+        x1, y1, x2, y2 = self.to_analysis(box_coords)
+        h, w = motion_integral.shape[0] - 1, motion_integral.shape[1] - 1
         
         # Clamp to image bounds
         x1, y1 = max(0, x1), max(0, y1)
@@ -221,189 +448,441 @@ class VideoCamera(object):
         
         if x2 <= x1 or y2 <= y1: return False
         
-        roi_motion = motion_mask[y1:y2, x1:x2]
-        motion_pixels = cv2.countNonZero(roi_motion)
+        motion_pixels = integral_sum(motion_integral, (x1, y1, x2, y2))
         total_pixels = (x2 - x1) * (y2 - y1)
         
-        if total_pixels == 0: return False
-        
         ratio = motion_pixels / total_pixels
         return ratio > threshold
 
+    def zones_have_motion(self, motion_integral, zones, threshold=0.002):
+        """True if any zone has at least a little motion inside its outline."""
+        for zone in zones:
+            if zone.motion_ratio(motion_integral) > threshold:
+                return True
+        return False
+
+    def get_analysis_frame(self, image):
+        """Downscale the frame to ANALYSIS_WIDTH (never upscales) and remember the scale."""
+        h, w = image.shape[:2]
+        if not ANALYSIS_WIDTH or w <= ANALYSIS_WIDTH:
+            self.analysis_scale = 1.0
+            return image
+        self.analysis_scale = ANALYSIS_WIDTH / float(w)
+        size = (ANALYSIS_WIDTH, max(1, int(round(h * self.analysis_scale))))
+        return cv2.resize(image, size, dst=self.scratch('analysis', (size[1], size[0], 3)), interpolation=cv2.INTER_AREA)
+
     def get_frame(self):
-        success, image = self.video.read()
+        """Capture, analyse, annotate and publish one frame.
+
+        Returns the annotated image, or None if no frame could be read.
+        """
+        # Reuse the previous capture buffer when the backend allows it
+        with self.timed('capture'):
+            success, image = self.video.read(self.capture_buffer)
         if not success:
+            self.count('capture_failures')
             return None
+        self.capture_buffer = image
+        # Threaded readers know when the frame was grabbed; otherwise it was just now
+        self.frame_time = getattr(self.video, 'frame_time', None) or time.time()
+
+        frame_start = time.perf_counter()
+
+        self.frame_size = (image.shape[1], image.shape[0])
+
+        with self.timed('motion'):
+            # Always Mirror View
+            image = cv2.flip(image, 1, dst=self.scratch('frame', image.shape))
+
+            # Motion, tamper and the global weapon scan work on a downscaled
+            # analysis frame; person/face crops are still cut from full resolution.
+            analysis = self.get_analysis_frame(image)
 
-        # Always Mirror View
-        image = cv2.flip(image, 1)
+            # Prep for motion detection
+            gray = cv2.cvtColor(analysis, cv2.COLOR_BGR2GRAY, dst=self.scratch('gray', analysis.shape[:2]))
+            motion_mask = self.get_motion_mask(gray)
+            # Integral image: motion inside any box or zone in O(1)
+            motion_integral = cv2.integral(motion_mask, sdepth=cv2.CV_32S)
+
+        # Settings snapshot for this frame; inference below runs without the lock.
+        config = self.config
+        current_time = time.time()
+        
+        # Check Tampering (Always active 24/7)
+        with self.timed('tamper'):
+            self.check_tampering(gray)
+        
+        # --- Detection Logic ---
+        night_time = is_night_time()
+        self.night_time = night_time # cached for get_status()
         
-        # Prep for motion detection
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        motion_mask = self.get_motion_mask(gray)
+        # ROI Based Person Detection (Away/Night Only)
+        should_detect_person = config.away_mode or (config.night_mode_enabled and night_time)
+        
+        # Adaptive Frame Skipping: skip still zones, run every frame while a threat develops
+        self.frame_count += 1
+        # A latched alarm is not a threat by itself: once the zones are still, back to the base rate
+        person_threat = self.person_detection_start_time is not None
+        weapon_threat = self.weapon_detection_start_time is not None or self.weapon_active
+        zones = self.get_zones(config.rois, self.frame_size, motion_mask.shape) if should_detect_person else ()
+        zone_motion = should_detect_person and self.zones_have_motion(motion_integral, zones)
+        scene_motion = config.weapon_check_enabled and motion_integral[-1, -1] > 0.002 * motion_mask.size
+        run_person, run_weapon = self.scheduler.plan(current_time, zone_motion, scene_motion, person_threat, weapon_threat)
+        run_person = run_person and should_detect_person
+        run_weapon = run_weapon and config.weapon_check_enabled
+        if self.stage_timer is not None:
+            self.count('frames')
+            if should_detect_person:
+                self.count('person_runs' if run_person else 'person_skips')
+            if config.weapon_check_enabled:
+                self.count('weapon_runs' if run_weapon else 'weapon_skips')
 
-        with self.lock:
-            current_time = time.time()
-            
-            # Check Tampering (Always active 24/7)
-            self.check_tampering(image)
-            
-            if self.tamper_active:
+        weapon_seen_now = False
+        person_seen_now = False
+        authorized_boxes = []
+
+        # --- 1. WEAPON DETECTION (Whole Frame - Independent of ROI/Arming) ---
+        # Person crops, the analysis frame or a sweep tile, see weapon_inputs()
+        # Check 1: User must have enabled it via UI button
+        if run_weapon:
+            with self.timed('weapon'):
+                weapon_seen_now = self.detect_weapons(image, analysis, current_time)
+
+        # --- 2. PERSON DETECTION (ROI Based & Armed Only) ---
+        if run_person:
+            unknown_boxes, authorized_boxes = self.detect_persons(image, motion_integral, zones, current_time)
+            person_seen_now = len(unknown_boxes) > 0
+            self.last_detections = unknown_boxes
+        elif not should_detect_person:
+            self.last_detections = []
+
+        # --- State Transitions (short, under lock) ---
+        with self.pipeline_lock():
+            # Settings changed while the models ran (e.g. disarmed): this
+            # frame's results belong to the old snapshot, so drop them.
+            if self.config is config:
+                if run_weapon or not config.weapon_check_enabled:
+                    self.update_weapon_state(config, weapon_seen_now, current_time)
+                if run_person or not should_detect_person:
+                    self.update_person_state(should_detect_person, person_seen_now, current_time)
+            alarm_active = self.alarm_active
+            weapon_active = self.weapon_active
+            tamper_active = self.tamper_active
+            self._publish_status()
+
+        # --- Drawing & Alerts ---
+        with self.timed('draw'):
+            if tamper_active:
                  cv2.putText(image, "CAMERA TAMPERED!", (50, 200), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 0, 255), 3)
-            
-            # --- Detection Logic ---
-            current_hour = datetime.datetime.now().hour
-            is_night_time = 0 <= current_hour < 5
-            
-            # ROI Based Person Detection (Away/Night Only)
-            should_detect_person = self.away_mode or (self.night_mode_enabled and is_night_time)
-            
-            # Frame Skipping (Process every 3rd frame)
-            self.frame_count += 1
-            if self.frame_count % 3 == 0:
-                self.last_detections = [] # Clear previous detections
-
-                # --- 1. WEAPON DETECTION (Global Scan - Independent of ROI/Person) ---
-                # Check 1: User must have enabled it via UI button
-                if self.weapon_check_enabled:
-                    w_results = self.model_weapon(image, verbose=False, conf=0.60) # High confidence
-                    weapon_seen_now = False
-                    
-                    for r in w_results:
-                        boxes = r.boxes
-                        for box in boxes:
-                            # Trusting custom model classes (0-4: Handgun, Knife, Dagger, Axe, Hammer)
-                            bx1, by1, bx2, by2 = map(int, box.xyxy[0].cpu().numpy())
-                            self.confirmed_weapon_boxes.append((bx1, by1, bx2, by2))
-                            weapon_seen_now = True
-
-                    # Persistence for Weapons (1.0 Second)
-                    if weapon_seen_now:
-                        self.last_weapon_seen_time = current_time
-                        if self.weapon_detection_start_time is None:
-                            self.weapon_detection_start_time = current_time
-                        
-                        if current_time - self.weapon_detection_start_time >= 1.0:
-                            # Respect dismissal
-                            if current_time > self.dismissed_until:
-                                self.weapon_active = True
-                    else:
-                        if current_time - self.last_weapon_seen_time > 0.5:
-                            self.weapon_detection_start_time = None
-                            if self.weapon_active and (current_time - self.last_weapon_seen_time > 5.0):
-                                self.weapon_active = False
-                else: 
-                     # Explicitly reset state if feature is disabled
-                     self.weapon_active = False
-                     self.weapon_detection_start_time = None
-
-                # --- 2. PERSON DETECTION (ROI Based & Armed Only) ---
-                if should_detect_person:
-
-                    # 2. Person Detection
-                    person_seen_now = False
-                    detected_in_any_zone = False
-                    
-                    for roi in self.rois:
-                        rx, ry, rw, rh = roi['rect']
-                        
-                        # Clip ROI
-                        h_img, w_img, _ = image.shape
-                        rx = max(0, min(rx, w_img))
-                        ry = max(0, min(ry, h_img))
-                        rw = max(0, min(rw, w_img - rx))
-                        rh = max(0, min(rh, h_img - ry))
-                        
-                        if rw > 0 and rh > 0:
-                            roi_crop = image[ry:ry+rh, rx:rx+rw]
-                            
-                            # Run inference
-                            # Increased confidence to 0.75 to reduce false positives
-                            results = self.model_person(roi_crop, classes=[0], verbose=False, conf=0.75)
-                            
-                            for r in results:
-                                boxes = r.boxes
-                                for box in boxes:
-                                    bx1, by1, bx2, by2 = box.xyxy[0].cpu().numpy()
-                                    gx1 = int(bx1 + rx)
-                                    gy1 = int(by1 + ry)
-                                    gx2 = int(bx2 + rx)
-                                    gy2 = int(by2 + ry)
-                                    
-                                    # --- MOTION CHECK ---
-                                    # Only confirm if this box has movement
-                                    if self.is_box_moving((gx1, gy1, gx2, gy2), motion_mask):
-                                        # --- FACE RECOGNITION CHECK ---
-                                        # Crop the face/person area for recognition
-                                        person_crop = image[gy1:gy2, gx1:gx2]
-                                        rgb_person = cv2.cvtColor(person_crop, cv2.COLOR_BGR2RGB)
-                                        
-                                        # Find faces in the crop (using lighter HOG model or CNN)
-                                        # We only verify if it's NOT a known person
-                                        face_locations = face_recognition.face_locations(rgb_person)
-                                        face_encodings = face_recognition.face_encodings(rgb_person, face_locations)
-                                        
-                                        is_known = False
-                                        for face_encoding in face_encodings:
-                                            matches = face_recognition.compare_faces(self.known_face_encodings, face_encoding, tolerance=0.6)
-                                            if True in matches:
-                                                is_known = True
-                                                print("Authorized Person Detected: Alert Supressed.")
-                                                break
-                                        
-                                        if not is_known:
-                                            person_seen_now = True
-                                            self.last_detections.append((gx1, gy1, gx2, gy2))
-                                        else:
-                                            # Optional: Draw green box for known person?
-                                            cv2.rectangle(image, (gx1, gy1), (gx2, gy2), (0, 255, 0), 2)
-                                            cv2.putText(image, "AUTHORIZED", (gx1, gy1-5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
-
-                    # Persistence for Person (2 Seconds)
-                    if person_seen_now:
-                        self.last_person_seen_time = current_time
-                        if self.person_detection_start_time is None:
-                            self.person_detection_start_time = current_time
-                        
-                        if current_time - self.person_detection_start_time >= 0.0: # Immediate alert
-                             detected_in_any_zone = True # Mark confirmed
-                    else:
-                         if current_time - self.last_person_seen_time > 0.5:
-                             self.person_detection_start_time = None
 
-                    if detected_in_any_zone:
-                         if current_time > self.dismissed_until:
-                            self.alarm_active = True
-                else:
-                    # Reset person timers if disarmed
-                    self.person_detection_start_time = None
-                    self.weapon_detection_start_time = None
+            for (gx1, gy1, gx2, gy2) in authorized_boxes:
+                cv2.rectangle(image, (gx1, gy1), (gx2, gy2), (0, 255, 0), 2)
+                cv2.putText(image, "AUTHORIZED", (gx1, gy1-5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
 
-            # --- Drawing & Alerts ---
-            
             # Draw ROIs
-            for roi in self.rois:
+            for roi in config.rois:
                 rx, ry, rw, rh = roi['rect']
-                cv2.rectangle(image, (rx, ry), (rx+rw, ry+rh), (255, 0, 0), 2)
+                if roi.get('points'):
+                    cv2.polylines(image, [np.array(roi['points'], dtype=np.int32)], True, (255, 0, 0), 2)
+                else:
+                    cv2.rectangle(image, (rx, ry), (rx+rw, ry+rh), (255, 0, 0), 2)
                 cv2.putText(image, roi['name'], (rx, ry-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 1)
 
             # Draw Person Detections (Only if confirmed/active phase)
             # If alarm is active, we assume valid detection
-            if self.alarm_active or (self.person_detection_start_time and (current_time - self.person_detection_start_time >= 0.0)):
+            if alarm_active or (self.person_detection_start_time and (current_time - self.person_detection_start_time >= 0.0)):
                  for (gx1, gy1, gx2, gy2) in self.last_detections:
                         cv2.rectangle(image, (gx1, gy1), (gx2, gy2), (0, 0, 255), 2)
                         cv2.putText(image, "Confirmed Person", (gx1, gy1-5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
-                        
+
             # Alert Logic
-            if self.weapon_active:
+            if weapon_active:
                 cv2.putText(image, "CRITICAL: WEAPON DETECTED", (10, 80), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 3)
 
-            elif self.alarm_active:
+            elif alarm_active:
                 alert_msg = "ALERT: PERSON CONFIRMED"
-                if is_night_time and self.night_mode_enabled and not self.away_mode:
+                if night_time and config.night_mode_enabled and not config.away_mode:
                         alert_msg = "NIGHT WATCH: INTRUDER"
                 cv2.putText(image, alert_msg, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
 
-        # Encode frame
-        ret, jpeg = cv2.imencode('.jpg', image)
-        return jpeg.tobytes()
+        # Encode once per subscribed profile; nothing at all if nobody is watching or recording
+        with self.timed('encode'):
+            encoded = self.streams.publish(image, required=(CLIP_PROFILE,) if self.recorder is not None else ())
+
+        alarms = {'person': alarm_active, 'weapon': weapon_active, 'tamper': tamper_active}
+        raised = [reason for reason, active in alarms.items() if active and not self.previous_alarms.get(reason)]
+        if self.events is not None:
+            for reason, active in alarms.items():
+                if active != bool(self.previous_alarms.get(reason)):
+                    self.log_event(reason, state='on' if active else 'off', frame_time=self.frame_time)
+        self.previous_alarms = alarms
+        if self.stage_timer is not None:
+            # Glass-to-alarm: from grabbing the frame to the alarm being published
+            now = time.time()
+            self.stage_timer.observe('frame_age', now - self.frame_time)
+            if raised:
+                self.stage_timer.observe('alarm_latency', now - self.frame_time)
+
+        # Event clips: every alarm that just turned on starts (or extends) a clip
+        if self.recorder is not None:
+            for reason in raised:
+                self.recorder.trigger(reason, current_time)
+            # The clip profile is encoded at its max_fps, not on every frame
+            if CLIP_PROFILE in encoded:
+                self.recorder.add_frame(encoded[CLIP_PROFILE], current_time)
+
+        elapsed = time.perf_counter() - frame_start
+        self.scheduler.record(elapsed)
+        if self.stage_timer is not None:
+            self.stage_timer.observe('frame', elapsed)
+        return image
+
+    def weapon_inputs(self, image, analysis, current_time):
+        """Images for this frame's weapon pass as [(image, x_offset, y_offset, scale, imgsz)].
+
+        'persons' mode: padded full-resolution crops around people tracked
+        in the last second, run at the small WEAPON_CROP_IMGSZ, so a weapon
+        keeps more pixels than in the downscaled frame at a fraction of a
+        full pass. People are only tracked inside armed zones, so the whole
+        analysis frame is scanned instead whenever there is no fresh track
+        or a recent weapon hit lies outside every person crop. Otherwise
+        one tile of a round-robin full-frame sweep is added every
+        WEAPON_TILE_SECONDS for small weapons away from the tracked people.
+        'global' mode: the whole analysis frame.
+        """
+        global_pass = (analysis, 0, 0, self.analysis_scale, MODEL_IMGSZ)
+        if WEAPON_SCAN == 'global':
+            return [global_pass]
+        h, w = image.shape[:2]
+        boxes = [pad_box(track.int_box(), WEAPON_PERSON_PAD, w, h) for track in self.person_tracker.tracks
+                 if current_time - track.last_update <= 1.0]
+        boxes = [box for box in boxes if box[2] > box[0] and box[3] > box[1]]
+        rects = merge_rects([(x1, y1, x2 - x1, y2 - y1) for (x1, y1, x2, y2) in boxes])
+        inputs = [(image[y:y+rh, x:x+rw], x, y, 1.0, WEAPON_CROP_IMGSZ) for (x, y, rw, rh) in rects]
+
+        recent_hits = self.last_weapon_boxes if current_time - self.last_weapon_seen_time <= 1.0 else []
+        if not boxes or any(not any(box_intersection(hit, crop) == hit for crop in boxes) for hit in recent_hits):
+            # Already covers the whole frame, no sweep tile needed
+            inputs.append(global_pass)
+        elif current_time - self.last_weapon_tile >= WEAPON_TILE_SECONDS:
+            tiles = tile_rects(w, h, WEAPON_TILE)
+            x, y, tw, th = tiles[self.sweep_index % len(tiles)]
+            self.sweep_index += 1
+            self.last_weapon_tile = current_time
+            inputs.append((image[y:y+th, x:x+tw], x, y, 1.0, MODEL_IMGSZ))
+        return inputs
+
+    def detect_weapons(self, image, analysis, current_time):
+        """Run the weapon model over this frame's weapon inputs (one batch per input size). Returns True if anything was found."""
+        inputs = self.weapon_inputs(image, analysis, current_time)
+        if not inputs:
+            return False
+        self.count('weapon_crops', len(inputs))
+
+        candidates = []
+        for imgsz in sorted(set(item[4] for item in inputs)):
+            batch = [item for item in inputs if item[4] == imgsz]
+            w_results = self.models.detect_weapons([crop for crop, _, _, _, _ in batch], verbose=False, conf=0.60, imgsz=imgsz) # High confidence
+            for (_, ox, oy, scale, _), r in zip(batch, w_results):
+                boxes = r.boxes
+                for box in boxes:
+                    # Trusting custom model classes (0-4: Handgun, Knife, Dagger, Axe, Hammer)
+                    # Back to full-resolution frame coordinates
+                    bx1, by1, bx2, by2 = box.xyxy[0].cpu().numpy() / scale
+                    candidates.append(((int(bx1 + ox), int(by1 + oy), int(bx2 + ox), int(by2 + oy)), float(box.conf[0])))
+
+        # Overlapping crops and tiles can see the same weapon
+        found = [box for box, _ in dedupe_boxes(candidates)]
+        self.confirmed_weapon_boxes.extend(found)
+        if found:
+            self.last_weapon_boxes = found
+        return len(found) > 0
+
+    def detect_persons(self, image, motion_integral, zones, current_time):
+        """Find moving people inside the zones (see get_zones()).
+
+        All zones go through the person model as one batch (cropped to
+        their bounding rects); overlapping zones are merged first so shared
+        pixels are only processed once.
+        Returns (unknown_boxes, authorized_boxes) in global frame coordinates.
+        """
+        unknown_boxes = []
+        authorized_boxes = []
+
+        # Zones entirely outside the frame have no rect
+        zones = [zone for zone in zones if zone.rect is not None and zone.area > 0]
+        if not zones:
+            return unknown_boxes, authorized_boxes
+
+        regions = merge_rects([zone.rect for zone in zones])
+        crops = [image[ry:ry+rh, rx:rx+rw] for (rx, ry, rw, rh) in regions]
+
+        # Run inference (one batched call for every zone)
+        # Increased confidence to 0.75 to reduce false positives
+        self.count('person_crops', len(crops))
+        with self.timed('person'):
+            results = self.models.detect_persons(crops, classes=[0], verbose=False, conf=0.75)
+
+        candidates = []
+        for (rx, ry, _, _), r in zip(regions, results):
+            boxes = r.boxes
+            for box in boxes:
+                bx1, by1, bx2, by2 = box.xyxy[0].cpu().numpy()
+                global_box = (int(bx1 + rx), int(by1 + ry), int(bx2 + rx), int(by2 + ry))
+
+                # A crop can cover pixels outside every zone; keep the part
+                # of the box inside the bounding rect of the zone whose
+                # outline it overlaps most, as a per-zone crop would have.
+                analysis_box = self.to_analysis(global_box)
+                best, best_overlap = None, 0
+                for zone in zones:
+                    overlap = zone.overlap(analysis_box)
+                    if overlap > best_overlap:
+                        best, best_overlap = zone, overlap
+                inter = box_intersection(global_box, best.box) if best is not None else None
+                if inter is not None:
+                    candidates.append((inter, float(box.conf[0])))
+
+        # Drop duplicates where zones overlap
+        detections = [box for box, _ in dedupe_boxes(candidates)]
+
+        # Stable IDs so the face verdict can be reused across frames
+        tracks = self.person_tracker.update(detections, current_time)
+        for (gx1, gy1, gx2, gy2), track in zip(detections, tracks):
+            # --- MOTION CHECK ---
+            # Only confirm if this box has movement
+            if self.is_box_moving((gx1, gy1, gx2, gy2), motion_integral):
+                if track.needs_verification(current_time):
+                    self.count('face_checks')
+                    with self.timed('face'):
+                        known, name, distance, had_face = self.identify_person(image[gy1:gy2, gx1:gx2])
+                    # Keep a face-backed "known" verdict (for a while) if this look just missed the face
+                    if had_face or not (track.known and track.had_face):
+                        track.set_identity(known, name, distance, had_face, current_time)
+                    else:
+                        track.keep_identity(current_time)
+                    if known:
+                        print(f"Authorized Person Detected ({name}, track {track.id}, distance {distance:.2f}): Alert Supressed.")
+                        self.log_event('authorized', name=name, track=track.id, distance=round(float(distance), 3))
+                if track.known:
+                    authorized_boxes.append((gx1, gy1, gx2, gy2))
+                else:
+                    unknown_boxes.append((gx1, gy1, gx2, gy2))
+        return unknown_boxes, authorized_boxes
+
+    def identify_person(self, person_crop):
+        """Run face recognition on a person crop.
+
+        Returns (known, name, distance, had_face). had_face is False when
+        no face was visible, i.e. the verdict is low confidence.
+        """
+        # --- FACE RECOGNITION CHECK ---
+        rgb_person = cv2.cvtColor(person_crop, cv2.COLOR_BGR2RGB)
+        
+        # We only verify if it's NOT a known person
+        face_encodings = self.models.encode_faces(rgb_person)
+        
+        face_index = self.models.face_index
+        best_distance = None
+        for face_encoding in face_encodings:
+            name, distance = face_index.match(face_encoding)
+            if name is not None:
+                return True, name, distance, True
+            if distance is not None and (best_distance is None or distance < best_distance):
+                best_distance = distance
+        return False, None, best_distance, len(face_encodings) > 0
+
+    def update_weapon_state(self, config, weapon_seen_now, current_time):
+        """Weapon persistence/alarm transition. Caller holds self.lock."""
+        if config.weapon_check_enabled:
+            # Persistence for Weapons (1.0 Second)
+            if weapon_seen_now:
+                self.last_weapon_seen_time = current_time
+                if self.weapon_detection_start_time is None:
+                    self.weapon_detection_start_time = current_time
+                
+                if current_time - self.weapon_detection_start_time >= 1.0:
+                    # Respect dismissal
+                    if current_time > self.dismissed_until:
+                        self.weapon_active = True
+            else:
+                if current_time - self.last_weapon_seen_time > 0.5:
+                    self.weapon_detection_start_time = None
+                    if self.weapon_active and (current_time - self.last_weapon_seen_time > 5.0):
+                        self.weapon_active = False
+        else: 
+             # Explicitly reset state if feature is disabled
+             self.weapon_active = False
+             self.weapon_detection_start_time = None
+
+    def update_person_state(self, should_detect_person, person_seen_now, current_time):
+        """Person persistence/alarm transition. Caller holds self.lock."""
+        if should_detect_person:
+            detected_in_any_zone = False
+
+            # Persistence for Person (2 Seconds)
+            if person_seen_now:
+                self.last_person_seen_time = current_time
+                if self.person_detection_start_time is None:
+                    self.person_detection_start_time = current_time
+                
+                if current_time - self.person_detection_start_time >= 0.0: # Immediate alert
+                     detected_in_any_zone = True # Mark confirmed
+            else:
+                 if current_time - self.last_person_seen_time > 0.5:
+                     self.person_detection_start_time = None
+
+            if detected_in_any_zone:
+                 if current_time > self.dismissed_until:
+                    self.alarm_active = True
+        else:
+            # Reset person timers if disarmed
+            self.person_detection_start_time = None
+            self.weapon_detection_start_time = None
+
+
+class CameraRegistry(object):
+    """All cameras on this host, keyed by camera id.
+
+    Each camera has its own pipeline thread, ROIs, modes and alarm state;
+    the models and face gallery are loaded once and shared.
+    """
+
+    def __init__(self, sources, models=None):
+        self.models = models or SharedModels()
+        self.clip_writer = ClipWriter() if RECORD_CLIPS else None
+        self.events = EventStore() if EVENTS_ENABLED else None
+        self.cameras = {}
+        for cam_id, source in sources:
+            camera = VideoCamera(cam_id, source, models=self.models, clip_writer=self.clip_writer, events=self.events)
+            if METRICS_ENABLED:
+                camera.stage_timer = CameraMetrics()
+            self.cameras[cam_id] = camera
+        self.default_id = sources[0][0] if sources else None
+
+    def get(self, cam_id=None):
+        """Camera by id; None means the default (first) camera."""
+        return self.cameras.get(cam_id or self.default_id)
+
+    def ids(self):
+        return list(self.cameras)
+
+    def start(self):
+        for camera in self.cameras.values():
+            camera.start()
+
+    def stop(self):
+        for camera in self.cameras.values():
+            camera.stop()
+        self.models.shutdown()
+        if self.clip_writer is not None:
+            self.clip_writer.close()
+        if self.events is not None:
+            self.events.close()
+
+    def reload_known_faces(self):
+        count = self.models.reload_known_faces()
+        # Cached verdicts were made against the old gallery
+        for camera in self.cameras.values():
+            camera.forget_identities()
+        return count
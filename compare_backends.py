@@ -0,0 +1,131 @@
+"""Compare inference backends on a local sample clip.
+
+Runs the same frames through each backend and reports latency and how
+closely its detections agree with the PyTorch reference.
+
+    python compare_backends.py sample.mp4 --model person --backends pytorch,onnx,openvino --int8
+"""
+import argparse
+import json
+import time
+
+import cv2
+import numpy as np
+
+import config
+from models import BACKENDS, load_detector
+from zones import box_iou
+
+MODELS = {'person': config.PERSON_MODEL, 'weapon': config.WEAPON_MODEL}
+
+
+def read_frames(path, max_frames, stride):
+    video = cv2.VideoCapture(path)
+    frames = []
+    index = 0
+    while len(frames) < max_frames:
+        success, frame = video.read()
+        if not success:
+            break
+        if index % stride == 0:
+            frames.append(frame)
+        index += 1
+    video.release()
+    return frames
+
+
+def run_backend(weights, backend, int8, frames, conf, warmup=3):
+    model = load_detector(weights, backend=backend, int8=int8)
+    loaded = getattr(model, 'inference_backend', backend)
+    for frame in frames[:warmup]:
+        model(frame, verbose=False, conf=conf)
+
+    latencies = []
+    detections = []
+    for frame in frames:
+        start = time.perf_counter()
+        results = model(frame, verbose=False, conf=conf)
+        latencies.append(time.perf_counter() - start)
+        boxes = []
+        for r in results:
+            for box in r.boxes:
+                boxes.append((tuple(float(v) for v in box.xyxy[0].cpu().numpy()), int(box.cls[0])))
+        detections.append(boxes)
+    return loaded, latencies, detections
+
+
+def agreement(reference, candidate, iou_threshold=0.5):
+    """Precision/recall of candidate detections against the reference, matched by class and IoU."""
+    matched = ref_total = cand_total = 0
+    for ref_boxes, cand_boxes in zip(reference, candidate):
+        ref_total += len(ref_boxes)
+        cand_total += len(cand_boxes)
+        used = set()
+        for box, cls in cand_boxes:
+            for i, (ref_box, ref_cls) in enumerate(ref_boxes):
+                if i not in used and cls == ref_cls and box_iou(box, ref_box) >= iou_threshold:
+                    used.add(i)
+                    matched += 1
+                    break
+    precision = matched / cand_total if cand_total else 1.0
+    recall = matched / ref_total if ref_total else 1.0
+    return precision, recall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('clip', help="Sample video file")
+    parser.add_argument('--model', choices=sorted(MODELS), default='person')
+    parser.add_argument('--backends', default=','.join(BACKENDS), help="Comma separated, first entry is the reference")
+    parser.add_argument('--int8', action='store_true', help="Also test INT8 variants of the non-pytorch backends")
+    parser.add_argument('--frames', type=int, default=100)
+    parser.add_argument('--stride', type=int, default=5, help="Use every Nth frame of the clip")
+    parser.add_argument('--conf', type=float, default=0.5)
+    parser.add_argument('--out', default='backend_report.json')
+    args = parser.parse_args()
+
+    frames = read_frames(args.clip, args.frames, args.stride)
+    if not frames:
+        parser.error(f"Could not read frames from {args.clip}")
+    weights = MODELS[args.model]
+
+    variants = []
+    for backend in args.backends.split(','):
+        variants.append((backend, False))
+        if args.int8 and backend != 'pytorch':
+            variants.append((backend, True))
+
+    report = {'clip': args.clip, 'model': weights, 'frames': len(frames), 'results': []}
+    reference = None
+    for backend, int8 in variants:
+        loaded, latencies, detections = run_backend(weights, backend, int8, frames, args.conf)
+        if reference is None:
+            reference = detections
+        precision, recall = agreement(reference, detections)
+        lat_ms = np.array(latencies) * 1000
+        report['results'].append({
+            'backend': backend,
+            'int8': int8,
+            'loaded_backend': loaded, # differs from backend if it fell back to pytorch
+            'mean_ms': float(lat_ms.mean()),
+            'p50_ms': float(np.percentile(lat_ms, 50)),
+            'p95_ms': float(np.percentile(lat_ms, 95)),
+            'fps': float(1000 / lat_ms.mean()),
+            'detections': sum(len(d) for d in detections),
+            'precision_vs_reference': precision,
+            'recall_vs_reference': recall,
+        })
+
+    print(f"{'backend':<16}{'loaded':<16}{'mean ms':>10}{'p95 ms':>10}{'fps':>10}{'prec':>8}{'recall':>8}")
+    for r in report['results']:
+        name = r['backend'] + (' int8' if r['int8'] else '')
+        print(f"{name:<16}{r['loaded_backend']:<16}{r['mean_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['fps']:>10.1f}"
+              f"{r['precision_vs_reference']:>8.2f}{r['recall_vs_reference']:>8.2f}")
+
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Runtime settings.
+
+Every value can be overridden with a SAFEVISION_* environment variable,
+e.g. SAFEVISION_BACKEND=openvino python main.py
+"""
+import os
+import re
+
+
+def _env(name, default, cast=str):
+    value = os.environ.get('SAFEVISION_' + name)
+    if value is None or value == '':
+        return default
+    if cast is bool:
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return cast(value)
+
+
+# --- Models ---
+PERSON_MODEL = _env('PERSON_MODEL', 'yolov8s.pt')
+WEAPON_MODEL = _env('WEAPON_MODEL', 'my_final_weapon_model.pt')
+# Inference backend: pytorch | onnx | openvino. Falls back to pytorch if export/load fails.
+# "stub" replaces both models with a weight-free blob detector (benchmarks, development).
+MODEL_BACKEND = _env('BACKEND', 'pytorch')
+# INT8 quantization for the onnx/openvino backends
+MODEL_INT8 = _env('INT8', False, bool)
+# INT8 calibration data: an ultralytics dataset yaml, or (ONNX) a sample video
+# file or image folder from the actual cameras, which calibrates best
+MODEL_INT8_DATA = _env('INT8_DATA', 'coco8.yaml')
+MODEL_IMGSZ = _env('IMGSZ', 640, int)
+
+# Threads in the shared inference pool (0 = one per CPU core)
+INFERENCE_WORKERS = _env('INFERENCE_WORKERS', 0, int)
+# Copies of each model loaded, i.e. how many cameras can run the same model at
+# once (0 = one per inference worker). Every copy holds its own weights in memory.
+MODEL_INSTANCES = _env('MODEL_INSTANCES', 2, int)
+
+# --- Faces ---
+# Match against one averaged encoding per person instead of every gallery image
+FACE_CENTROIDS = _env('FACE_CENTROIDS', False, bool)
+
+# --- Analysis ---
+# Width of the downscaled frame used for motion, tamper and the global
+# weapon scan (WEAPON_SCAN=global) (0 = full resolution). Person/face crops always use full resolution.
+ANALYSIS_WIDTH = _env('ANALYSIS_WIDTH', 640, int)
+
+# --- Weapon scan ---
+# persons: run the weapon model on padded full-resolution crops around tracked
+# people at WEAPON_CROP_IMGSZ, plus one tile of a round-robin full-frame sweep
+# every WEAPON_TILE_SECONDS; frames with nobody tracked (or a recent hit outside
+# the crops) get one pass over the analysis frame instead of the tile.
+# global: one pass over the whole analysis frame.
+WEAPON_SCAN = _env('WEAPON_SCAN', 'persons')
+WEAPON_CROP_IMGSZ = _env('WEAPON_CROP_IMGSZ', 320, int) # model input size for person crops
+WEAPON_TILE_SECONDS = _env('WEAPON_TILE_SECONDS', 0.5, float)
+WEAPON_TILE = _env('WEAPON_TILE', 640, int) # sweep tile size in capture pixels
+WEAPON_PERSON_PAD = _env('WEAPON_PERSON_PAD', 0.25, float) # crop margin, fraction of the person box
+
+# --- Metrics ---
+# Per-stage histograms and counters served at /metrics (Prometheus text format).
+# Off removes the instrumentation from the frame loop entirely.
+METRICS_ENABLED = _env('METRICS', True, bool)
+
+# --- Cameras ---
+# Read live cameras/streams on a grab thread that drops stale frames and
+# reconnects with backoff, instead of reading in the frame loop.
+CAPTURE_THREADED = _env('CAPTURE_THREADED', True, bool)
+# Comma separated id=source pairs. A source is a device index, a video file,
+# an image folder, "synthetic[:WxH]" or a stream URL (see sources.py),
+# e.g. "front=0,gate=rtsp://10.0.0.5/stream1"
+CAMERAS = _env('CAMERAS', 'default=0')
+
+
+def parse_cameras(spec=None):
+    """Parse the CAMERAS spec into an ordered list of (cam_id, source)."""
+    cameras = []
+    for i, item in enumerate(s.strip() for s in (spec or CAMERAS).split(',')):
+        if not item:
+            continue
+        cam_id, sep, source = item.partition('=')
+        # No "id=" prefix (URLs may contain '=' in their query string)
+        if not sep or not re.match(r'^[\w-]+$', cam_id.strip()):
+            cam_id, source = f"cam{i}", item
+        source = source.strip()
+        cameras.append((cam_id.strip(), int(source) if source.isdigit() else source))
+    return cameras
+
+# --- Event clips ---
+RECORD_CLIPS = _env('RECORD_CLIPS', True, bool)
+CLIP_DIR = _env('CLIP_DIR', 'clips')
+CLIP_PROFILE = _env('CLIP_PROFILE', 'high') # stream profile (see stream.py) used for clips, incl. its max_fps
+CLIP_PRE_SECONDS = _env('CLIP_PRE_SECONDS', 5.0, float) # kept in memory before an alarm
+CLIP_POST_SECONDS = _env('CLIP_POST_SECONDS', 10.0, float) # recorded after the last alarm transition
+CLIP_BUFFER_MB = _env('CLIP_BUFFER_MB', 32, int) # per-camera cap on the pre-alarm buffer
+CLIP_MAX_MB = _env('CLIP_MAX_MB', 256, int) # cap on a single clip
+CLIP_MAX_TOTAL_MB = _env('CLIP_MAX_TOTAL_MB', 2048, int) # oldest clips are deleted above this
+CLIP_MAX_AGE_DAYS = _env('CLIP_MAX_AGE_DAYS', 30, float)
+
+# --- Event history ---
+EVENTS_ENABLED = _env('EVENTS', True, bool)
+EVENT_DB = _env('EVENT_DB', 'events.db') # SQLite file
+EVENT_MAX_AGE_DAYS = _env('EVENT_MAX_AGE_DAYS', 365, float) # older events are deleted (0 = keep forever)
@@ -0,0 +1,166 @@
+"""Persistent alert/event history.
+
+Every alarm transition, authorized face, dismissal, mode change and zone
+edit is appended to a local SQLite database. Cameras only put events on
+a queue; a single writer thread inserts them in batches, so the frame
+loop never waits on the disk. Queries page through the (camera, time)
+and (type, time) indexes with a keyset cursor, so they stay fast however
+many months of events the database holds.
+"""
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+import config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    camera TEXT NOT NULL,
+    type TEXT NOT NULL,
+    detail TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_events_ts ON events (ts);
+CREATE INDEX IF NOT EXISTS idx_events_camera_ts ON events (camera, ts);
+CREATE INDEX IF NOT EXISTS idx_events_type_ts ON events (type, ts);
+"""
+
+MAX_PAGE = 1000
+
+
+class EventStore(object):
+    """SQLite event log with a batched background writer."""
+
+    def __init__(self, path=None, batch_size=500, flush_interval=1.0, queue_size=10000, max_age_days=None):
+        self.path = path or config.EVENT_DB
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_age = (max_age_days if max_age_days is not None else config.EVENT_MAX_AGE_DAYS) * 86400
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        db = self._connect()
+        # WAL lets API queries read while the writer inserts
+        db.execute("PRAGMA journal_mode=WAL")
+        db.executescript(SCHEMA)
+        db.close()
+
+        self.thread = threading.Thread(target=self._run, name="event-writer", daemon=True)
+        self.thread.start()
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=10)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def record(self, camera, event_type, detail=None, ts=None):
+        """Queue an event. Never blocks: if the writer falls far behind, the event is dropped."""
+        try:
+            self.queue.put_nowait((ts or time.time(), camera, event_type, json.dumps(detail) if detail else None))
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 100 == 1:
+                print(f"Warning: event writer busy, {self.dropped} events dropped")
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join(timeout=5)
+
+    def _run(self):
+        db = self._connect()
+        # With WAL, NORMAL only risks the last batches on power loss, not corruption
+        db.execute("PRAGMA synchronous=NORMAL")
+        last_prune = 0
+        running = True
+        while running:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            # Collect up to batch_size events, or whatever arrived within flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                batch.append(item)
+            try:
+                if batch:
+                    with db:
+                        db.executemany("INSERT INTO events (ts, camera, type, detail) VALUES (?, ?, ?, ?)", batch)
+                if self.max_age and time.time() - last_prune > 3600:
+                    last_prune = time.time()
+                    with db:
+                        db.execute("DELETE FROM events WHERE ts < ?", (last_prune - self.max_age,))
+            except sqlite3.Error as e:
+                print(f"Error writing events: {e}")
+        db.close()
+
+    def query(self, camera=None, types=None, since=None, until=None, limit=100, cursor=None):
+        """Events newest first, as (events, next_cursor).
+
+        types is a list of event types; since/until are epoch seconds.
+        Pass next_cursor back as cursor for the following page; it is
+        None on the last page.
+        """
+        limit = max(1, min(int(limit), MAX_PAGE))
+        where, args = [], []
+        if camera:
+            where.append("camera = ?")
+            args.append(camera)
+        if since is not None:
+            where.append("ts >= ?")
+            args.append(float(since))
+        if until is not None:
+            where.append("ts < ?")
+            args.append(float(until))
+        if cursor:
+            # Keyset pagination: strictly older than the last row of the previous page
+            ts, _, event_id = cursor.partition(':')
+            where.append("(ts, id) < (?, ?)")
+            args.extend([float(ts), int(event_id)])
+
+        def page(conditions, values):
+            sql = "SELECT id, ts, camera, type, detail FROM events"
+            if conditions:
+                sql += " WHERE " + " AND ".join(conditions)
+            return sql + " ORDER BY ts DESC, id DESC LIMIT ?", values + [limit + 1]
+
+        types = list(dict.fromkeys(types or ()))
+        if len(types) <= 1:
+            sql, args = page(["type = ?"] * len(types) + where, types + args)
+        else:
+            # "type IN (...)" would read every matching row and sort them; instead
+            # take the newest rows of each type from its index and merge those.
+            parts, merged_args = [], []
+            for event_type in types:
+                part, part_args = page(["type = ?"] + where, [event_type] + args)
+                parts.append(f"SELECT * FROM ({part})")
+                merged_args += part_args
+            sql = " UNION ALL ".join(parts) + " ORDER BY ts DESC, id DESC LIMIT ?"
+            args = merged_args + [limit + 1]
+
+        db = self._connect()
+        try:
+            rows = db.execute(sql, args).fetchall()
+        finally:
+            db.close()
+        events = [{
+            'id': row['id'],
+            'time': row['ts'],
+            'camera': row['camera'],
+            'type': row['type'],
+            'detail': json.loads(row['detail']) if row['detail'] else {},
+        } for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = events[-1]
+            next_cursor = f"{last['time']!r}:{last['id']}"
+        return events, next_cursor
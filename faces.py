@@ -0,0 +1,196 @@
+"""Authorized face gallery with a persistent encoding cache.
+
+Encodings are stored as one float32 matrix (encodings.npy) plus a JSON
+manifest keyed by image path with mtime, size and SHA-1. On startup only
+new or changed images are run through dlib; everything else is read back
+from the cache.
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+import face_recognition
+
+DATASET_PATH = "face_dataset"
+CACHE_DIR = "face_cache"
+TOLERANCES_FILE = "tolerances.json" # optional {"name": tolerance} in the dataset folder
+ENCODING_SIZE = 128
+DEFAULT_TOLERANCE = 0.6
+MANIFEST_VERSION = 1
+
+
+def _file_sha1(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class FaceGallery(object):
+    """Loads face_dataset/<name>/<image> into an encoding matrix, using the on-disk cache."""
+
+    def __init__(self, dataset_path=DATASET_PATH, cache_dir=CACHE_DIR):
+        self.dataset_path = dataset_path
+        self.cache_dir = cache_dir
+        self.matrix_path = os.path.join(cache_dir, "encodings.npy")
+        self.manifest_path = os.path.join(cache_dir, "manifest.json")
+
+    def _scan(self):
+        """List (rel_path, person_name, abs_path) for every dataset image."""
+        images = []
+        for person_name in sorted(os.listdir(self.dataset_path)):
+            person_dir = os.path.join(self.dataset_path, person_name)
+            if not os.path.isdir(person_dir):
+                continue
+            for image_name in sorted(os.listdir(person_dir)):
+                if image_name.startswith('.'): continue
+                image_path = os.path.join(person_dir, image_name)
+                images.append((os.path.join(person_name, image_name), person_name, image_path))
+        return images
+
+    def _load_cache(self):
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+            if manifest.get('version') != MANIFEST_VERSION:
+                return {}, None
+            matrix = np.load(self.matrix_path, mmap_mode='r')
+            entries = manifest.get('entries', {})
+            if matrix.ndim != 2 or any(e['row'] >= len(matrix) for e in entries.values()):
+                return {}, None
+            return entries, matrix
+        except (OSError, ValueError, KeyError, TypeError):
+            return {}, None
+
+    def _save_cache(self, entries, matrix):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Write to temp files first so a crash never leaves a half-written cache
+        tmp_matrix = self.matrix_path + ".tmp.npy"
+        tmp_manifest = self.manifest_path + ".tmp"
+        np.save(tmp_matrix, matrix)
+        with open(tmp_manifest, 'w') as f:
+            json.dump({'version': MANIFEST_VERSION, 'entries': entries}, f)
+        os.replace(tmp_matrix, self.matrix_path)
+        os.replace(tmp_manifest, self.manifest_path)
+
+    def load_tolerances(self):
+        """Per-person match tolerances from face_dataset/tolerances.json, if present."""
+        path = os.path.join(self.dataset_path, TOLERANCES_FILE)
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path) as f:
+                return {str(k): float(v) for k, v in json.load(f).items()}
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"Error loading {path}: {e}")
+            return {}
+
+    def load(self):
+        """Return (encodings, names): an (N, 128) float32 matrix and one name per row."""
+        if not os.path.exists(self.dataset_path):
+            print(f"Warning: {self.dataset_path} not found.")
+            return np.empty((0, ENCODING_SIZE), dtype=np.float32), []
+
+        old_entries, old_matrix = self._load_cache()
+        by_sha1 = {e['sha1']: e for e in old_entries.values()}
+
+        entries = {}
+        rows = []
+        names = []
+        encoded = reused = 0
+        for rel_path, person_name, image_path in self._scan():
+            try:
+                st = os.stat(image_path)
+                entry = old_entries.get(rel_path)
+                if entry is None or entry['mtime'] != st.st_mtime or entry['size'] != st.st_size:
+                    # Path is new or touched: fall back to the content hash,
+                    # which also catches renamed/moved files.
+                    sha1 = _file_sha1(image_path)
+                    entry = by_sha1.get(sha1)
+                else:
+                    sha1 = entry['sha1']
+
+                if entry is not None:
+                    encoding = old_matrix[entry['row']] if entry['row'] >= 0 else None
+                    reused += 1
+                else:
+                    image = face_recognition.load_image_file(image_path)
+                    encodings = face_recognition.face_encodings(image)
+                    encoding = encodings[0] if encodings else None
+                    encoded += 1
+                    if encoding is not None:
+                        print(f"Loaded: {person_name} ({os.path.basename(image_path)})")
+
+                row = -1
+                if encoding is not None:
+                    row = len(rows)
+                    rows.append(np.array(encoding, dtype=np.float32))
+                    names.append(person_name)
+                entries[rel_path] = {'mtime': st.st_mtime, 'size': st.st_size, 'sha1': sha1, 'name': person_name, 'row': row}
+            except Exception as e:
+                print(f"Error loading {image_path}: {e}")
+
+        matrix = np.array(rows, dtype=np.float32).reshape(-1, ENCODING_SIZE)
+        del old_matrix # release the memory map before replacing the file
+        if entries != old_entries:
+            try:
+                self._save_cache(entries, matrix)
+            except OSError as e:
+                print(f"Warning: could not write face cache: {e}")
+        print(f"Face cache: {reused} cached, {encoded} encoded")
+        return matrix, names
+
+
+class FaceIndex(object):
+    """Nearest-neighbour lookup over the gallery matrix.
+
+    Distances for a query are computed for every row in one vectorized
+    pass (|q|^2 - 2 M.q + |m|^2 with the row norms precomputed), so the
+    cost stays flat as the gallery grows. With use_centroids each person
+    is reduced to the mean of their encodings, which keeps the matrix at
+    one row per person regardless of how many photos they have.
+    """
+
+    def __init__(self, encodings, names, tolerance=DEFAULT_TOLERANCE, tolerances=None, use_centroids=False):
+        encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_SIZE)
+        tolerances = tolerances or {}
+        self.identities = sorted(set(names))
+
+        if use_centroids and len(names):
+            label_of = {n: i for i, n in enumerate(self.identities)}
+            labels = np.array([label_of[n] for n in names])
+            matrix = np.stack([encodings[labels == i].mean(axis=0) for i in range(len(self.identities))])
+            self.names = list(self.identities)
+        else:
+            matrix = encodings
+            self.names = list(names)
+
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.sq_norms = np.einsum('ij,ij->i', self.matrix, self.matrix)
+        self.tolerances = np.array([tolerances.get(n, tolerance) for n in self.names], dtype=np.float32)
+
+    def __len__(self):
+        return len(self.names)
+
+    def distances(self, encoding):
+        """Euclidean distance from one encoding to every row."""
+        q = np.asarray(encoding, dtype=np.float32)
+        sq = self.sq_norms - 2.0 * self.matrix.dot(q) + q.dot(q)
+        return np.sqrt(np.maximum(sq, 0.0))
+
+    def match(self, encoding):
+        """Return (name, distance) of the best match, or (None, distance) if nobody is within tolerance.
+
+        The best row is the one that beats its own tolerance by the widest
+        margin, so a stricter per-person tolerance is respected.
+        """
+        if not len(self.names):
+            return None, None
+        dist = self.distances(encoding)
+        best = int(np.argmin(dist - self.tolerances))
+        distance = float(dist[best])
+        if distance <= self.tolerances[best]:
+            return self.names[best], distance
+        return None, float(dist.min())
@@ -1,44 +1,88 @@
-from flask import Flask, render_template, Response, request, jsonify
-from camera import VideoCamera
-import time
+from flask import Flask, render_template, Response, request, jsonify, abort
+from camera import CameraRegistry
+import config
+import metrics
+from stream import DEFAULT_PROFILE, STREAM_PROFILES
+import datetime
+import json
 
 app = Flask(__name__)
-camera = VideoCamera()
+# One VideoCamera per configured source (SAFEVISION_CAMERAS), sharing one set of models
+registry = CameraRegistry(config.parse_cameras())
+registry.start()
 
-@app.route('/')
-def index():
-    return render_template('index.html')
+def get_camera(cam_id):
+    """Camera for a route; the un-scoped legacy routes use the default camera."""
+    camera = registry.get(cam_id)
+    if camera is None:
+        abort(404, description=f"Unknown camera: {cam_id}")
+    return camera
 
-def gen(camera):
-    while True:
-        frame = camera.get_frame()
-        if frame:
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n\r\n')
-        else:
-            time.sleep(0.1)
+@app.route('/', defaults={'cam_id': None})
+@app.route('/camera/<cam_id>')
+def index(cam_id):
+    camera = get_camera(cam_id)
+    profile = request.args.get('profile', DEFAULT_PROFILE)
+    if profile not in STREAM_PROFILES:
+        profile = DEFAULT_PROFILE
+    return render_template('index.html', cam_id=camera.cam_id, cameras=registry.ids(), profile=profile)
+
+@app.route('/api/cameras', methods=['GET'])
+def list_cameras():
+    return jsonify([{"id": cam_id, "status": registry.get(cam_id).get_status()} for cam_id in registry.ids()])
+
+def gen(camera, profile):
+    # Viewers only wait for the pipeline's next frame; they never
+    # drive capture or inference themselves.
+    camera.subscribe(profile)
+    try:
+        seq = 0
+        while True:
+            seq, frame = camera.wait_for_frame(seq, profile=profile)
+            if seq is None:
+                return # camera stopped
+            if frame:
+                yield (b'--frame\r\n'
+                       b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n\r\n')
+    finally:
+        # Runs when the client disconnects; unwatched profiles stop being encoded
+        camera.unsubscribe(profile)
 
-@app.route('/video_feed')
-def video_feed():
-    return Response(gen(camera),
+@app.route('/video_feed', defaults={'cam_id': None})
+@app.route('/video_feed/<cam_id>')
+def video_feed(cam_id):
+    camera = get_camera(cam_id)
+    # e.g. /video_feed/front?profile=low for slow links (see stream.STREAM_PROFILES)
+    profile = request.args.get('profile', DEFAULT_PROFILE)
+    if profile not in STREAM_PROFILES:
+        abort(400, description=f"Unknown stream profile: {profile}")
+    return Response(gen(camera, profile),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
-@app.route('/api/set_roi', methods=['POST'])
-def set_roi():
+@app.route('/api/set_roi', defaults={'cam_id': None}, methods=['POST'])
+@app.route('/api/<cam_id>/set_roi', methods=['POST'])
+def set_roi(cam_id):
+    camera = get_camera(cam_id)
     data = request.json
     try:
-        x = data['x']
-        y = data['y']
-        w = data['w']
-        h = data['h']
         name = data.get('name', 'Zone')
-        roi_id = camera.add_roi(x, y, w, h, name)
+        if 'points' in data:
+            # Polygon zone: {"points": [[x, y], ...]}
+            roi_id = camera.add_polygon_roi(data['points'], name)
+        else:
+            x = data['x']
+            y = data['y']
+            w = data['w']
+            h = data['h']
+            roi_id = camera.add_roi(x, y, w, h, name)
         return jsonify({"success": True, "id": roi_id})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 400
 
-@app.route('/api/delete_roi', methods=['POST'])
-def delete_roi():
+@app.route('/api/delete_roi', defaults={'cam_id': None}, methods=['POST'])
+@app.route('/api/<cam_id>/delete_roi', methods=['POST'])
+def delete_roi(cam_id):
+    camera = get_camera(cam_id)
     data = request.json
     try:
         roi_id = data['id']
@@ -47,47 +91,136 @@ def delete_roi():
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 400
 
-@app.route('/api/get_rois', methods=['GET'])
-def get_rois():
+@app.route('/api/get_rois', defaults={'cam_id': None}, methods=['GET'])
+@app.route('/api/<cam_id>/get_rois', methods=['GET'])
+def get_rois(cam_id):
+    camera = get_camera(cam_id)
     return jsonify(camera.get_rois())
 
-@app.route('/api/toggle_away', methods=['POST'])
-def toggle_away():
+@app.route('/api/toggle_away', defaults={'cam_id': None}, methods=['POST'])
+@app.route('/api/<cam_id>/toggle_away', methods=['POST'])
+def toggle_away(cam_id):
+    camera = get_camera(cam_id)
     data = request.json
     status = data.get('status', False)
     camera.toggle_away_mode(status)
     return jsonify({"success": True, "status": camera.away_mode})
 
-@app.route('/api/toggle_night_mode', methods=['POST'])
-def toggle_night_mode():
+@app.route('/api/toggle_night_mode', defaults={'cam_id': None}, methods=['POST'])
+@app.route('/api/<cam_id>/toggle_night_mode', methods=['POST'])
+def toggle_night_mode(cam_id):
+    camera = get_camera(cam_id)
     data = request.json
     status = data.get('status', False)
     camera.toggle_night_mode(status)
     return jsonify({"success": True, "status": camera.night_mode_enabled})
 
-@app.route('/api/toggle_weapon_detection', methods=['POST'])
-def toggle_weapon_detection():
+@app.route('/api/toggle_weapon_detection', defaults={'cam_id': None}, methods=['POST'])
+@app.route('/api/<cam_id>/toggle_weapon_detection', methods=['POST'])
+def toggle_weapon_detection(cam_id):
+    camera = get_camera(cam_id)
     data = request.json
     status = data.get('status', False)
     camera.toggle_weapon_detection(status)
     return jsonify({"success": True, "status": camera.weapon_check_enabled})
 
-@app.route('/api/dismiss_alert', methods=['POST'])
-def dismiss_alert():
+@app.route('/api/dismiss_alert', defaults={'cam_id': None}, methods=['POST'])
+@app.route('/api/<cam_id>/dismiss_alert', methods=['POST'])
+def dismiss_alert(cam_id):
+    camera = get_camera(cam_id)
     camera.dismiss_alert()
     return jsonify({"success": True})
 
-@app.route('/api/status', methods=['GET'])
-def get_status():
+@app.route('/api/status', defaults={'cam_id': None}, methods=['GET'])
+@app.route('/api/<cam_id>/status', methods=['GET'])
+def get_status(cam_id):
+    camera = get_camera(cam_id)
     return jsonify(camera.get_status())
 
-@app.route('/api/trigger_call', methods=['POST'])
-def trigger_call():
+def status_events(camera):
+    # Server-Sent Events: one event per status/ROI change, plus a keep-alive
+    # comment so dead connections are noticed.
+    version, sent_status, sent_rois = 0, None, None
+    while True:
+        version, status, rois = camera.wait_for_status(version)
+        idle = True
+        if status != sent_status:
+            changed = sorted(k for k in status if sent_status is None or status[k] != sent_status.get(k))
+            yield f"event: status\ndata: {json.dumps(dict(status, changed=changed))}\n\n"
+            sent_status = status
+            idle = False
+        if rois != sent_rois:
+            yield f"event: rois\ndata: {json.dumps(rois)}\n\n"
+            sent_rois = rois
+            idle = False
+        if idle:
+            yield ": keep-alive\n\n"
+
+@app.route('/api/stream', defaults={'cam_id': None})
+@app.route('/api/<cam_id>/stream')
+def stream_status(cam_id):
+    camera = get_camera(cam_id)
+    return Response(status_events(camera), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def parse_time(value):
+    """Epoch seconds or an ISO 8601 timestamp (local time unless it has an offset)."""
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.datetime.fromisoformat(value).timestamp()
+
+@app.route('/api/events', defaults={'cam_id': None}, methods=['GET'])
+@app.route('/api/<cam_id>/events', methods=['GET'])
+def list_events(cam_id):
+    # e.g. /api/events?type=person,weapon&since=2024-05-01T00:00&limit=50, then &cursor=<next_cursor>
+    if registry.events is None:
+        abort(404, description="Event history is disabled (SAFEVISION_EVENTS=0)")
+    if cam_id is not None:
+        get_camera(cam_id)
+    camera_filter = cam_id or request.args.get('camera')
+    types = [t for t in request.args.get('type', '').split(',') if t]
+    try:
+        events, next_cursor = registry.events.query(
+            camera=camera_filter,
+            types=types,
+            since=parse_time(request.args.get('since')),
+            until=parse_time(request.args.get('until')),
+            limit=request.args.get('limit', 100),
+            cursor=request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    return jsonify({"events": events, "next_cursor": next_cursor})
+
+@app.route('/api/reload_faces', methods=['POST'])
+def reload_faces():
+    # Hot-reload the authorized face gallery (only new/changed images are encoded)
+    try:
+        count = registry.reload_known_faces()
+        return jsonify({"success": True, "known_faces": count})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/metrics')
+def prometheus_metrics():
+    # Prometheus scrape target: per-stage latency histograms, frame/inference counters, viewers
+    if not config.METRICS_ENABLED:
+        abort(404, description="Metrics are disabled (SAFEVISION_METRICS=0)")
+    return Response(metrics.render(registry.cameras), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/trigger_call', defaults={'cam_id': None}, methods=['POST'])
+@app.route('/api/<cam_id>/trigger_call', methods=['POST'])
+def trigger_call(cam_id):
+    camera = get_camera(cam_id)
     # Simulate calling police
     print("----------- CALLING POLICE (SIMULATED) -----------")
+    print(f"CAMERA: {camera.cam_id}")
     print("DIALING 112...")
     print("CONNECTED.")
     print("--------------------------------------------------")
+    camera.log_event('police_call')
     
     # We can also reset the alarm here if desired, or let the user manually stop it.
     camera.reset_alarm()
@@ -95,4 +228,5 @@ def trigger_call():
 
 if __name__ == '__main__':
     # Using port 5001 to avoid conflict with AirPlay Receiver on macOS (port 5000)
-    app.run(host='0.0.0.0', port=5001, debug=True)
+    # Reloader disabled: it would start a second process competing for the camera device.
+    app.run(host='0.0.0.0', port=5001, debug=True, use_reloader=False)
@@ -0,0 +1,146 @@
+"""Pipeline metrics in Prometheus text format.
+
+Each camera gets a CameraMetrics as its stage_timer. Only that camera's
+pipeline thread writes to it, so recording takes no lock; a scrape may
+see a histogram mid-update, which Prometheus tolerates. With metrics off
+the camera has no stage_timer and the hooks cost nothing.
+"""
+import bisect
+import time
+
+# Histogram bucket bounds in seconds, from lock waits (~µs) up to stalled inference
+BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+           0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Recorded like stages, exported as histograms of their own
+LATENCIES = {
+    'lock_wait': ('safevision_lock_wait_seconds', "Time the pipeline waited for the camera state lock."),
+    'frame_age': ('safevision_frame_age_seconds', "Time from grabbing a frame to publishing it."),
+    'alarm_latency': ('safevision_alarm_latency_seconds', "Time from grabbing a frame to raising the alarm it triggered."),
+}
+
+COUNTERS = {
+    'frames': "Frames run through the pipeline.",
+    'capture_failures': "Failed frame reads.",
+    'pipeline_errors': "Frames that raised an exception.",
+    'person_runs': "Frames the person model ran on.",
+    'person_skips': "Armed frames the scheduler skipped person detection on.",
+    'person_crops': "Zone crops sent to the person model.",
+    'weapon_runs': "Frames the weapon model ran on.",
+    'weapon_skips': "Frames the scheduler skipped the weapon scan on.",
+    'weapon_crops': "Crops and tiles sent to the weapon model.",
+    'face_checks': "Face recognition runs.",
+}
+
+
+class Histogram(object):
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Timing(object):
+    """Reusable context manager timing one stage (stages never nest with themselves)."""
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class CameraMetrics(object):
+    """Stage histograms and counters of one camera."""
+
+    def __init__(self):
+        self.histograms = {}
+        self.timings = {}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+
+    def histogram(self, stage):
+        hist = self.histograms.get(stage)
+        if hist is None:
+            hist = self.histograms[stage] = Histogram()
+            self.timings[stage] = _Timing(hist)
+        return hist
+
+    def time(self, stage):
+        timing = self.timings.get(stage)
+        if timing is None:
+            self.histogram(stage)
+            timing = self.timings[stage]
+        return timing
+
+    def observe(self, stage, seconds):
+        self.histogram(stage).observe(seconds)
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+
+def _labels(**labels):
+    return ','.join(f'{k}="{v}"' for k, v in labels.items())
+
+
+def _histogram_lines(name, labels, hist):
+    cumulative = 0
+    for bound, count in zip(hist.buckets, hist.counts):
+        cumulative += count
+        yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+    yield f'{name}_bucket{{{labels},le="+Inf"}} {hist.count}'
+    yield f'{name}_sum{{{labels}}} {hist.sum:.6f}'
+    yield f'{name}_count{{{labels}}} {hist.count}'
+
+
+def render(cameras):
+    """Prometheus text exposition for a {cam_id: VideoCamera} dict."""
+    measured = [(cam_id, cam.stage_timer) for cam_id, cam in cameras.items()
+                if isinstance(cam.stage_timer, CameraMetrics)]
+    lines = []
+
+    lines.append('# HELP safevision_stage_seconds Time spent in each pipeline stage.')
+    lines.append('# TYPE safevision_stage_seconds histogram')
+    for cam_id, metrics in measured:
+        for stage, hist in sorted(metrics.histograms.items()):
+            if stage not in LATENCIES:
+                lines.extend(_histogram_lines('safevision_stage_seconds', _labels(camera=cam_id, stage=stage), hist))
+
+    for key, (name, help_text) in LATENCIES.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for cam_id, metrics in measured:
+            if key in metrics.histograms:
+                lines.extend(_histogram_lines(name, _labels(camera=cam_id), metrics.histograms[key]))
+
+    for name, help_text in COUNTERS.items():
+        lines.append(f'# HELP safevision_{name}_total {help_text}')
+        lines.append(f'# TYPE safevision_{name}_total counter')
+        for cam_id, metrics in measured:
+            lines.append(f'safevision_{name}_total{{{_labels(camera=cam_id)}}} {metrics.counters.get(name, 0)}')
+
+    # Threaded capture readers (sources.LatestFrameReader)
+    readers = [(cam_id, cam.video) for cam_id, cam in cameras.items() if hasattr(cam.video, 'dropped')]
+    for attr, help_text in (('dropped', "Stale frames dropped by the capture thread."),
+                            ('reconnects', "Capture source reconnects.")):
+        lines.append(f'# HELP safevision_capture_{attr}_total {help_text}')
+        lines.append(f'# TYPE safevision_capture_{attr}_total counter')
+        for cam_id, reader in readers:
+            lines.append(f'safevision_capture_{attr}_total{{{_labels(camera=cam_id)}}} {getattr(reader, attr)}')
+
+    lines.append('# HELP safevision_stream_subscribers Connected video viewers per stream profile.')
+    lines.append('# TYPE safevision_stream_subscribers gauge')
+    for cam_id, cam in cameras.items():
+        for profile, count in sorted(cam.streams.subscribers.items()):
+            lines.append(f'safevision_stream_subscribers{{{_labels(camera=cam_id, profile=profile)}}} {count}')
+    return '\n'.join(lines) + '\n'
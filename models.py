@@ -0,0 +1,304 @@
+"""Pluggable inference backends for the YOLO models.
+
+The PyTorch weights can be exported once to ONNX or OpenVINO, optionally
+INT8-quantized, and the exported model is loaded through the same
+ultralytics YOLO interface, so callers do not change. Exports are cached
+next to the weights and rebuilt when the weights are newer. Any failure
+falls back to plain PyTorch. The "stub" backend needs no weights at
+all, for benchmarks and development without a GPU.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import face_recognition
+import numpy as np
+from ultralytics import YOLO
+
+import config
+from faces import FaceGallery, FaceIndex
+from sources import open_source
+
+BACKENDS = ('pytorch', 'onnx', 'openvino')
+
+
+def export_path(weights, backend, int8=False):
+    """Where the exported model for these weights lives."""
+    stem = os.path.splitext(weights)[0]
+    if backend == 'onnx':
+        return stem + ('_int8.onnx' if int8 else '.onnx')
+    if backend == 'openvino':
+        return stem + ('_int8_openvino_model' if int8 else '_openvino_model')
+    return weights
+
+
+def _is_stale(weights, path):
+    if not os.path.exists(path):
+        return True
+    # Hub weights (e.g. yolov8s.pt) may not be on disk until ultralytics downloads them
+    return os.path.exists(weights) and os.path.getmtime(path) < os.path.getmtime(weights)
+
+
+def calibration_frames(source=None, count=100):
+    """Up to count BGR frames for INT8 calibration.
+
+    source is a video file, an image folder or an ultralytics dataset
+    yaml (its validation images are used); default MODEL_INT8_DATA.
+    """
+    source = source or config.MODEL_INT8_DATA
+    if source.endswith(('.yaml', '.yml')):
+        from ultralytics.data.utils import check_det_dataset
+        val = check_det_dataset(source)['val'] # downloads the dataset if needed
+        source = val[0] if isinstance(val, (list, tuple)) else val
+    video = open_source(source)
+    frames = []
+    try:
+        while len(frames) < count:
+            success, frame = video.read()
+            if not success:
+                break
+            frames.append(frame.copy())
+    finally:
+        video.release()
+    if not frames:
+        raise ValueError(f"No calibration frames in {source}")
+    return frames
+
+
+def _letterbox_blob(image, imgsz):
+    """Frame as the exported model's input: letterboxed to imgsz, RGB, NCHW float32 in [0, 1]."""
+    h, w = image.shape[:2]
+    scale = imgsz / float(max(h, w))
+    nw, nh = max(1, int(round(w * scale))), max(1, int(round(h * scale)))
+    canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    top, left = (imgsz - nh) // 2, (imgsz - nw) // 2
+    canvas[top:top+nh, left:left+nw] = cv2.resize(image, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    return cv2.dnn.blobFromImage(canvas, 1.0 / 255.0, swapRB=True)
+
+
+def _quantize_onnx(fp32_path, int8_path, imgsz):
+    # Static QDQ quantization: activation ranges are measured on calibration
+    # frames, so convolutions run as int8 kernels. Dynamic quantization would
+    # emit ConvInteger ops, which onnxruntime's CPU provider runs slower than FP32.
+    import onnxruntime
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    input_name = onnxruntime.InferenceSession(fp32_path, providers=['CPUExecutionProvider']).get_inputs()[0].name
+
+    class FrameReader(CalibrationDataReader):
+        def __init__(self, frames):
+            self.frames = iter(frames)
+
+        def get_next(self):
+            frame = next(self.frames, None)
+            return None if frame is None else {input_name: _letterbox_blob(frame, imgsz)}
+
+    quantize_static(fp32_path, int8_path, FrameReader(calibration_frames()), quant_format=QuantFormat.QDQ,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8, per_channel=True)
+
+
+def export_model(weights, backend, int8=False, imgsz=None):
+    """Export weights for backend (if not already up to date) and return the exported path."""
+    imgsz = imgsz or config.MODEL_IMGSZ
+    path = export_path(weights, backend, int8)
+    if backend == 'pytorch' or not _is_stale(weights, path):
+        return path
+
+    print(f"Exporting {weights} to {backend}{' (INT8)' if int8 else ''}...")
+    model = YOLO(weights)
+    # dynamic=True keeps the batch axis free for batched ROI crops
+    if backend == 'onnx':
+        fp32_path = export_path(weights, 'onnx')
+        if _is_stale(weights, fp32_path):
+            exported = model.export(format='onnx', imgsz=imgsz, dynamic=True)
+            if os.path.abspath(exported) != os.path.abspath(fp32_path):
+                os.replace(exported, fp32_path)
+        if int8:
+            _quantize_onnx(fp32_path, path, imgsz)
+    elif backend == 'openvino':
+        kwargs = {'int8': True, 'data': config.MODEL_INT8_DATA} if int8 else {}
+        exported = model.export(format='openvino', imgsz=imgsz, dynamic=True, **kwargs)
+        if os.path.abspath(exported) != os.path.abspath(path):
+            os.replace(exported, path)
+    else:
+        raise ValueError(f"Unknown backend: {backend}")
+    return path
+
+
+class _StubTensor(object):
+    def __init__(self, values):
+        self.values = values
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.values
+
+
+class _StubBox(object):
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = [_StubTensor(np.array(xyxy, dtype=np.float32))]
+        self.conf = np.array([conf], dtype=np.float32)
+        self.cls = np.array([cls], dtype=np.float32)
+
+
+class _StubResult(object):
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+class StubDetector(object):
+    """Weight-free stand-in with the slice of the ultralytics interface we use.
+
+    Reports every large bright blob as a class-0 detection (e.g. the
+    walkers of sources.SyntheticSource). latency adds a delay per image
+    at MODEL_IMGSZ, scaled with the input area for other imgsz values, to
+    imitate a real model.
+    """
+    inference_backend = 'stub'
+
+    def __init__(self, latency=0.0, min_area=0.005, conf=0.9):
+        self.latency = latency
+        self.min_area = min_area
+        self.conf = conf
+
+    def __call__(self, images, conf=0.25, classes=None, imgsz=None, **kwargs):
+        if isinstance(images, np.ndarray):
+            images = [images]
+        latency = self.latency * (float(imgsz or config.MODEL_IMGSZ) / config.MODEL_IMGSZ) ** 2
+        results = []
+        for image in images:
+            if latency:
+                time.sleep(latency)
+            boxes = []
+            if self.conf >= conf and (classes is None or 0 in classes):
+                gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+                _, mask = cv2.threshold(gray, 200, 255, cv2.THRESH_BINARY)
+                contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+                for contour in contours:
+                    x, y, w, h = cv2.boundingRect(contour)
+                    if w * h >= self.min_area * gray.size:
+                        boxes.append(_StubBox((x, y, x + w, y + h), self.conf, 0))
+            results.append(_StubResult(boxes))
+        return results
+
+
+def load_detector(weights, backend=None, int8=None):
+    """Load a YOLO detector on the configured backend, falling back to PyTorch."""
+    backend = backend or config.MODEL_BACKEND
+    int8 = config.MODEL_INT8 if int8 is None else int8
+    if backend == 'stub':
+        print(f"Using stub detector instead of {weights}")
+        return StubDetector()
+    if backend not in BACKENDS:
+        print(f"Warning: unknown backend '{backend}', using pytorch.")
+        backend = 'pytorch'
+
+    if backend != 'pytorch':
+        try:
+            path = export_model(weights, backend, int8)
+            model = YOLO(path, task='detect')
+            model.inference_backend = backend + ('-int8' if int8 else '')
+            print(f"Using {model.inference_backend} backend: {path}")
+            return model
+        except Exception as e:
+            print(f"Warning: {backend} backend unavailable ({e}), falling back to pytorch.")
+    model = YOLO(weights)
+    model.inference_backend = 'pytorch'
+    return model
+
+
+class DetectorPool(object):
+    """A few copies of one detector, each used by one thread at a time.
+
+    The YOLO predictors keep per-call state and are not thread-safe, so a
+    call borrows a free copy and hands it back afterwards; up to
+    len(models) inferences of the same model run at once.
+    """
+
+    def __init__(self, weights, count, backend=None):
+        self.models = [load_detector(weights, backend=backend) for _ in range(max(1, count))]
+        self.inference_backend = getattr(self.models[0], 'inference_backend', None)
+        self.free = queue.Queue()
+        for model in self.models:
+            self.free.put(model)
+
+    def __call__(self, images, **kwargs):
+        model = self.free.get()
+        try:
+            return model(images, **kwargs)
+        finally:
+            self.free.put(model)
+
+
+class SharedModels(object):
+    """Models and the face gallery, loaded once per process and shared by every camera.
+
+    Heavy calls go through a thread pool sized to the CPU cores, so any
+    number of cameras never run more inferences at once than there are
+    cores. Threads rather than processes: torch, onnxruntime and dlib
+    release the GIL. Each model is loaded MODEL_INSTANCES times (see
+    DetectorPool), so that many cameras can run it concurrently.
+    """
+
+    def __init__(self, workers=None, backend=None, instances=None):
+        self.workers = workers or config.INFERENCE_WORKERS or os.cpu_count() or 1
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+        # More copies than workers could never run at once
+        instances = min(self.workers, instances or config.MODEL_INSTANCES or self.workers)
+
+        print(f"Loading Person Detection Model (YOLOv8 Small) x{instances}...")
+        # Upgraded to 's' model for better accuracy (less false positives like pillows)
+        self.model_person = DetectorPool(config.PERSON_MODEL, instances, backend=backend)
+        
+        print(f"Loading Weapon Detection Model (Custom) x{instances}...")
+        # Custom model for Handgun, Knife, Dagger, Axe, Hammer
+        self.model_weapon = DetectorPool(config.WEAPON_MODEL, instances, backend=backend)
+
+        # --- Face Recognition Setup ---
+        self.face_gallery = FaceGallery()
+        self.face_reload_lock = threading.Lock()
+        self.face_index = FaceIndex([], [])
+        self.load_known_faces()
+
+    def run(self, fn, *args, **kwargs):
+        """Run fn on the shared pool and wait for its result."""
+        return self.executor.submit(fn, *args, **kwargs).result()
+
+    def detect_persons(self, images, **kwargs):
+        return self.run(self.model_person, images, **kwargs)
+
+    def detect_weapons(self, images, **kwargs):
+        return self.run(self.model_weapon, images, **kwargs)
+
+    @staticmethod
+    def _encode_faces(rgb_image):
+        # Find faces in the crop (using lighter HOG model or CNN)
+        face_locations = face_recognition.face_locations(rgb_image)
+        return face_recognition.face_encodings(rgb_image, face_locations)
+
+    def encode_faces(self, rgb_image):
+        """Face encodings for every face found in an RGB image."""
+        return self.run(self._encode_faces, rgb_image)
+
+    def load_known_faces(self):
+        """Load known faces from face_dataset folder (through the encoding cache)."""
+        print("Loading Known Faces...")
+        encodings, names = self.face_gallery.load()
+        # Swapped in one assignment so the pipelines always see a consistent index
+        self.face_index = FaceIndex(encodings, names, tolerances=self.face_gallery.load_tolerances(),
+                                    use_centroids=config.FACE_CENTROIDS)
+        print(f"Total Known Faces: {len(names)}")
+        return len(names)
+
+    def reload_known_faces(self):
+        """Re-scan face_dataset while running. Only new or changed images are encoded."""
+        with self.face_reload_lock:
+            return self.load_known_faces()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
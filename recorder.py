@@ -0,0 +1,157 @@
+"""Pre-alarm ring buffer and event clip recorder.
+
+Each camera keeps the last few seconds of encoded frames in memory. When
+an alarm fires, that buffer plus the following seconds become a clip,
+which is handed to a background writer thread so capture never waits on
+the disk. Clips are written as plain MJPEG (concatenated JPEG frames,
+playable with ffmpeg/VLC) with a JSON sidecar, and the clip directory is
+kept under a size and age limit.
+"""
+import datetime
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+import config
+
+CLIP_EXTENSIONS = ('.mjpeg', '.json') # files written per clip
+
+
+class ClipWriter(object):
+    """Single background thread that writes finished clips and enforces retention."""
+
+    def __init__(self, clip_dir=None, max_total_bytes=None, max_age_days=None, queue_size=8):
+        self.clip_dir = clip_dir or config.CLIP_DIR
+        self.max_total_bytes = max_total_bytes if max_total_bytes is not None else config.CLIP_MAX_TOTAL_MB * 1024 * 1024
+        self.max_age = (max_age_days if max_age_days is not None else config.CLIP_MAX_AGE_DAYS) * 86400
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.thread = threading.Thread(target=self._run, name="clip-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, clip):
+        """Queue a finished clip. Never blocks: if the disk is too slow, the clip is dropped."""
+        try:
+            self.queue.put_nowait(clip)
+        except queue.Full:
+            self.dropped += 1
+            print(f"Warning: clip writer busy, dropped clip {clip['cam_id']}/{clip['reason']}")
+
+    def close(self):
+        self.queue.put(None)
+
+    def _run(self):
+        while True:
+            clip = self.queue.get()
+            if clip is None:
+                return
+            try:
+                self.write(clip)
+                self.enforce_retention()
+            except OSError as e:
+                print(f"Error writing clip: {e}")
+
+    def write(self, clip):
+        cam_dir = os.path.join(self.clip_dir, clip['cam_id'])
+        os.makedirs(cam_dir, exist_ok=True)
+        stamp = datetime.datetime.fromtimestamp(clip['trigger_time']).strftime('%Y%m%d-%H%M%S-%f')[:-3]
+        base = os.path.join(cam_dir, f"{stamp}_{clip['reason']}")
+        timestamps = []
+        with open(base + ".mjpeg", 'wb') as f:
+            for ts, frame in clip['frames']:
+                f.write(frame)
+                timestamps.append(round(ts, 3))
+        with open(base + ".json", 'w') as f:
+            json.dump({
+                'cam_id': clip['cam_id'],
+                'reason': clip['reason'],
+                'trigger_time': clip['trigger_time'],
+                'frame_times': timestamps,
+            }, f)
+        print(f"Saved clip: {base}.mjpeg ({len(timestamps)} frames)")
+
+    def enforce_retention(self):
+        """Delete clips older than max_age, then the oldest clips until under max_total_bytes.
+
+        Only the files write() produces (<clip_dir>/<camera>/*.mjpeg and
+        *.json) are considered; anything else in the folder is left alone.
+        """
+        files = []
+        try:
+            cam_dirs = [os.path.join(self.clip_dir, name) for name in os.listdir(self.clip_dir)]
+        except OSError:
+            return
+        for cam_dir in cam_dirs:
+            if not os.path.isdir(cam_dir):
+                continue
+            for name in os.listdir(cam_dir):
+                if not name.endswith(CLIP_EXTENSIONS):
+                    continue
+                path = os.path.join(cam_dir, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        now = time.time()
+        for mtime, size, path in files:
+            if now - mtime <= self.max_age and total <= self.max_total_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+
+class ClipRecorder(object):
+    """Per-camera ring buffer of recent frames that turns alarms into clips."""
+
+    def __init__(self, cam_id, writer, pre_seconds=None, post_seconds=None, max_buffer_bytes=None, max_clip_bytes=None):
+        self.cam_id = cam_id
+        self.writer = writer
+        self.pre_seconds = pre_seconds if pre_seconds is not None else config.CLIP_PRE_SECONDS
+        self.post_seconds = post_seconds if post_seconds is not None else config.CLIP_POST_SECONDS
+        self.max_buffer_bytes = max_buffer_bytes or config.CLIP_BUFFER_MB * 1024 * 1024
+        self.max_clip_bytes = max_clip_bytes or config.CLIP_MAX_MB * 1024 * 1024
+
+        self.buffer = deque() # (timestamp, jpeg bytes)
+        self.buffer_bytes = 0
+        self.clip = None # clip being recorded
+        self.clip_bytes = 0
+
+    def add_frame(self, frame, timestamp):
+        """Append an encoded frame. Called from the camera pipeline thread."""
+        self.buffer.append((timestamp, frame))
+        self.buffer_bytes += len(frame)
+        while self.buffer and (timestamp - self.buffer[0][0] > self.pre_seconds or self.buffer_bytes > self.max_buffer_bytes):
+            _, old = self.buffer.popleft()
+            self.buffer_bytes -= len(old)
+
+        if self.clip is not None:
+            self.clip['frames'].append((timestamp, frame))
+            self.clip_bytes += len(frame)
+            if timestamp >= self.clip['end_time'] or self.clip_bytes > self.max_clip_bytes:
+                self.writer.submit(self.clip)
+                self.clip = None
+
+    def trigger(self, reason, timestamp):
+        """Start a clip (or extend the current one) for an alarm transition."""
+        if self.clip is not None:
+            self.clip['end_time'] = max(self.clip['end_time'], timestamp + self.post_seconds)
+            if reason not in self.clip['reason'].split('+'):
+                self.clip['reason'] += '+' + reason
+            return
+        self.clip = {
+            'cam_id': self.cam_id,
+            'reason': reason,
+            'trigger_time': timestamp,
+            'end_time': timestamp + self.post_seconds,
+            'frames': list(self.buffer),
+        }
+        self.clip_bytes = self.buffer_bytes
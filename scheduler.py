@@ -0,0 +1,74 @@
+"""Adaptive scheduling of the heavy model passes.
+
+Replaces the fixed "every 3rd frame" skip. Person inference only runs
+when the zones show motion, runs every frame while a threat is developing,
+and everything backs off when frames take longer than the latency budget.
+"""
+
+
+class InferenceScheduler(object):
+    """Decides per frame whether the person and weapon models should run."""
+
+    def __init__(self, base_interval=3, max_interval=15, max_backoff=4, latency_budget=0.15, weapon_heartbeat=2.0):
+        self.base_interval = base_interval # frames between runs while there is motion
+        self.max_interval = max_interval
+        self.max_backoff = max_backoff
+        self.latency_budget = latency_budget # seconds per frame
+        self.weapon_heartbeat = weapon_heartbeat # seconds between weapon scans of a still scene
+
+        self.backoff = 1
+        self.latency_ema = None
+        self.cooldown = 0
+        self.frames_since_person = 0
+        self.frames_since_weapon = 0
+        self.last_weapon_run = 0
+
+    def interval(self, threat):
+        if threat:
+            return self.backoff
+        return min(self.max_interval, self.base_interval * self.backoff)
+
+    def plan(self, now, zone_motion, scene_motion, person_threat, weapon_threat):
+        """Return (run_person, run_weapon) for this frame.
+
+        zone_motion: something moved inside the ROIs.
+        scene_motion: something moved anywhere in the frame.
+        person_threat: a person detection is developing.
+        weapon_threat: a weapon detection is developing or its alarm is active.
+        """
+        self.frames_since_person += 1
+        self.frames_since_weapon += 1
+
+        # Still zones cannot produce a confirmed (moving) person, so skip them entirely.
+        run_person = (zone_motion or person_threat) and self.frames_since_person >= self.interval(person_threat)
+        if run_person:
+            self.frames_since_person = 0
+
+        # Weapons can be held still, so a still scene still gets a slow heartbeat scan.
+        run_weapon = False
+        if (scene_motion or weapon_threat) and self.frames_since_weapon >= self.interval(weapon_threat):
+            run_weapon = True
+        elif now - self.last_weapon_run >= self.weapon_heartbeat:
+            run_weapon = True
+        if run_weapon:
+            self.frames_since_weapon = 0
+            self.last_weapon_run = now
+        return run_person, run_weapon
+
+    def record(self, seconds, alpha=0.2, settle_frames=30):
+        """Feed back how long the last frame took and adjust the backoff."""
+        if self.latency_ema is None:
+            self.latency_ema = seconds
+        else:
+            self.latency_ema += alpha * (seconds - self.latency_ema)
+
+        # Give a new rate time to show up in the average before changing again
+        if self.cooldown > 0:
+            self.cooldown -= 1
+            return
+        if self.latency_ema > self.latency_budget and self.backoff < self.max_backoff:
+            self.backoff += 1
+            self.cooldown = settle_frames
+        elif self.latency_ema < 0.5 * self.latency_budget and self.backoff > 1:
+            self.backoff -= 1
+            self.cooldown = settle_frames
@@ -0,0 +1,218 @@
+"""Frame sources for VideoCamera.
+
+Every source has the cv2.VideoCapture interface the camera uses:
+read(image=None) -> (success, frame), isOpened() and release(). Besides
+live cameras and streams this allows replaying a video file, an image
+folder or a synthetic scene, e.g. for benchmarks. Live cameras and streams
+can be read on a background thread that keeps only the newest frame.
+"""
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+class VideoFileSource(object):
+    """Video file, optionally looped."""
+
+    def __init__(self, path, loop=False):
+        self.path = path
+        self.loop = loop
+        self.video = cv2.VideoCapture(path)
+
+    def read(self, image=None):
+        success, frame = self.video.read(image)
+        if not success and self.loop:
+            self.video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            success, frame = self.video.read(image)
+        return success, frame
+
+    def isOpened(self):
+        return self.video.isOpened()
+
+    def release(self):
+        self.video.release()
+
+
+class ImageDirectorySource(object):
+    """Images of a folder in name order, optionally looped."""
+
+    def __init__(self, path, loop=False):
+        self.paths = sorted(os.path.join(path, name) for name in os.listdir(path)
+                            if name.lower().endswith(IMAGE_EXTENSIONS))
+        self.loop = loop
+        self.index = 0
+
+    def read(self, image=None):
+        if self.index >= len(self.paths):
+            if not self.loop or not self.paths:
+                return False, None
+            self.index = 0
+        frame = cv2.imread(self.paths[self.index])
+        self.index += 1
+        return frame is not None, frame
+
+    def isOpened(self):
+        return len(self.paths) > 0
+
+    def release(self):
+        pass
+
+
+class SyntheticSource(object):
+    """Generated scene: noisy background with a few bright boxes walking across it.
+
+    Deterministic for a given seed, so benchmark runs are comparable.
+    """
+
+    def __init__(self, width=1280, height=720, frames=None, walkers=2, seed=0):
+        self.width = width
+        self.height = height
+        self.frames = frames # None = endless
+        self.count = 0
+        rng = np.random.RandomState(seed)
+        self.background = rng.randint(40, 90, (height, width, 3)).astype(np.uint8)
+        self.walkers = [(rng.randint(0, width), rng.randint(0, height // 2), rng.choice([-1, 1]) * rng.randint(4, 12))
+                        for _ in range(walkers)]
+
+    def read(self, image=None):
+        if self.frames is not None and self.count >= self.frames:
+            return False, None
+        if image is None or image.shape != self.background.shape:
+            image = np.empty_like(self.background)
+        np.copyto(image, self.background)
+        box_w, box_h = self.width // 12, self.height // 3
+        for x0, y0, speed in self.walkers:
+            x = (x0 + speed * self.count) % (self.width - box_w)
+            cv2.rectangle(image, (x, y0), (x + box_w, y0 + box_h), (230, 230, 230), -1)
+        self.count += 1
+        return True, image
+
+    def isOpened(self):
+        return True
+
+    def release(self):
+        pass
+
+
+def open_capture(source, timeout=5.0):
+    """cv2.VideoCapture for a device or stream, with open/read timeouts where OpenCV supports them."""
+    if isinstance(source, str) and hasattr(cv2, 'CAP_PROP_READ_TIMEOUT_MSEC'):
+        ms = int(timeout * 1000)
+        return cv2.VideoCapture(source, cv2.CAP_ANY, [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, ms, cv2.CAP_PROP_READ_TIMEOUT_MSEC, ms])
+    return cv2.VideoCapture(source)
+
+
+class LatestFrameReader(object):
+    """Reads a live source on its own thread and keeps only the newest frame.
+
+    A camera delivers frames whether or not the pipeline keeps up; read
+    synchronously, the backlog queues up in the driver and the analysed
+    image falls seconds behind. Here stale frames are simply overwritten
+    (and counted in dropped), so a frame is never older than one capture
+    interval plus one pipeline pass. frame_time is the wall-clock time the
+    last returned frame was grabbed. A source that fails or stalls for
+    stall_timeout seconds is reopened with exponential backoff.
+    """
+
+    def __init__(self, source, stall_timeout=5.0, max_backoff=30.0):
+        self.source = source
+        self.stall_timeout = stall_timeout
+        self.max_backoff = max_backoff
+        self.video = open_capture(source, stall_timeout)
+
+        self.condition = threading.Condition()
+        # Three buffers: the newest frame, the one the pipeline holds and one being filled
+        self.buffers = [None, None, None]
+        self.latest = None # index into buffers
+        self.held = None
+        self.seq = 0
+        self.read_seq = 0
+        self.latest_time = None
+        self.frame_time = None
+        self.dropped = 0
+        self.reconnects = 0
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name=f"capture-{source}", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        backoff = 0.5
+        last_frame = time.monotonic()
+        while self.running:
+            with self.condition:
+                slot = next(i for i in range(3) if i != self.latest and i != self.held)
+            success, frame = self.video.read(self.buffers[slot])
+            if success:
+                backoff = 0.5
+                last_frame = time.monotonic()
+                with self.condition:
+                    self.buffers[slot] = frame
+                    if self.seq != self.read_seq:
+                        self.dropped += 1 # the previous frame was never read
+                    self.latest = slot
+                    self.latest_time = time.time()
+                    self.seq += 1
+                    self.condition.notify_all()
+                continue
+
+            if time.monotonic() - last_frame < self.stall_timeout and self.video.isOpened():
+                time.sleep(0.01)
+                continue
+            # Dead or stalled: reopen, waiting longer after every failed attempt
+            print(f"Capture lost ({self.source}), reconnecting in {backoff:.1f}s...")
+            self.video.release()
+            time.sleep(backoff)
+            backoff = min(self.max_backoff, backoff * 2)
+            if not self.running:
+                break
+            self.video = open_capture(self.source, self.stall_timeout)
+            self.reconnects += 1
+            last_frame = time.monotonic()
+
+    def read(self, image=None, timeout=1.0):
+        """Newest frame not returned before, waiting up to timeout. image is ignored."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.seq != self.read_seq or not self.running, timeout)
+            if self.seq == self.read_seq:
+                return False, None
+            self.read_seq = self.seq
+            self.held = self.latest
+            self.frame_time = self.latest_time
+            return True, self.buffers[self.held]
+
+    def isOpened(self):
+        return self.video.isOpened()
+
+    def release(self):
+        self.running = False
+        with self.condition:
+            self.condition.notify_all()
+        if self.thread is not threading.current_thread():
+            self.thread.join(timeout=self.stall_timeout + 1)
+        self.video.release()
+
+
+def open_source(source, loop=False, threaded=False):
+    """Open a frame source.
+
+    source may be a device index, a stream URL, a video file, an image
+    folder, or "synthetic[:WIDTHxHEIGHT]". With threaded, live devices
+    and streams get a LatestFrameReader; files are always read in order.
+    """
+    if isinstance(source, str):
+        if source.startswith('synthetic'):
+            _, _, size = source.partition(':')
+            width, height = (int(v) for v in size.split('x')) if size else (1280, 720)
+            return SyntheticSource(width, height)
+        if os.path.isdir(source):
+            return ImageDirectorySource(source, loop=loop)
+        if os.path.isfile(source):
+            return VideoFileSource(source, loop=loop)
+    if threaded:
+        return LatestFrameReader(source)
+    return open_capture(source)
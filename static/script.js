@@ -18,12 +18,33 @@ document.addEventListener('DOMContentLoaded', () => {
     const systemStatusPill = document.getElementById('systemStatusPill');
     const statusTextPill = document.getElementById('statusTextPill');
 
+    // Camera this dashboard controls (camera-scoped API routes)
+    const camId = document.body.dataset.camId;
+    const apiUrl = (path) => camId ? `/api/${encodeURIComponent(camId)}/${path}` : `/api/${path}`;
+
+    const cameraSelect = document.getElementById('cameraSelect');
+    if (cameraSelect) {
+        cameraSelect.addEventListener('change', () => {
+            // Keep the chosen stream profile (?profile=...) when switching cameras
+            window.location.href = `/camera/${encodeURIComponent(cameraSelect.value)}${window.location.search}`;
+        });
+    }
+
     // State
     let isDrawingMode = false;
     let isDrawing = false;
     let startX, startY, endX, endY;
+    // Polygon being drawn: a click adds a corner, clicking the first corner
+    // (or double-clicking) closes it. Dragging still draws a rectangle.
+    let polygonPoints = [];
     let awayMode = false;
     let zones = [];
+    // Capture resolution reported by the server. Zones are stored in these
+    // coordinates, which differ from the image size on reduced stream profiles.
+    let frameWidth = 0;
+    let frameHeight = 0;
+    const sourceWidth = () => frameWidth || video.naturalWidth;
+    const sourceHeight = () => frameHeight || video.naturalHeight;
 
     // Resize canvas
     function resizeCanvas() {
@@ -51,19 +72,26 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // --- Zone Management ---
 
+    function exitDrawingMode() {
+        isDrawingMode = false;
+        polygonPoints = [];
+        videoContainer.classList.remove('selecting');
+        videoContainer.style.cursor = "default";
+        btnAddZone.innerHTML = '<i class="fa-solid fa-plus"></i> Add Zone';
+        btnAddZone.classList.remove('active');
+        drawAllZones();
+    }
+
     btnAddZone.addEventListener('click', () => {
-        isDrawingMode = !isDrawingMode;
         if (isDrawingMode) {
-            videoContainer.classList.add('selecting');
-            videoContainer.style.cursor = "crosshair";
-            btnAddZone.innerHTML = '<i class="fa-solid fa-xmark"></i> Cancel';
-            btnAddZone.classList.add('active');
-        } else {
-            videoContainer.classList.remove('selecting');
-            videoContainer.style.cursor = "default";
-            btnAddZone.innerHTML = '<i class="fa-solid fa-plus"></i> Add Zone';
-            btnAddZone.classList.remove('active');
+            exitDrawingMode();
+            return;
         }
+        isDrawingMode = true;
+        videoContainer.classList.add('selecting');
+        videoContainer.style.cursor = "crosshair";
+        btnAddZone.innerHTML = '<i class="fa-solid fa-xmark"></i> Cancel';
+        btnAddZone.classList.add('active');
     });
 
     // Drawing Logic (Mouse & Touch)
@@ -93,11 +121,30 @@ document.addEventListener('DOMContentLoaded', () => {
         e.preventDefault(); // Prevent scrolling on mobile
         isDrawing = true;
         const pos = getPointerPos(e);
-        startX = pos.x;
-        startY = pos.y;
+        startX = endX = pos.x;
+        startY = endY = pos.y;
+    }
+
+    function drawPolygonDraft(cursor) {
+        drawAllZones();
+        if (polygonPoints.length === 0) return;
+        ctx.strokeStyle = '#3b82f6';
+        ctx.lineWidth = 2;
+        ctx.setLineDash([5, 3]);
+        ctx.beginPath();
+        ctx.moveTo(polygonPoints[0].x, polygonPoints[0].y);
+        polygonPoints.slice(1).forEach(p => ctx.lineTo(p.x, p.y));
+        if (cursor) ctx.lineTo(cursor.x, cursor.y);
+        ctx.stroke();
+        ctx.setLineDash([]);
+        polygonPoints.forEach(p => ctx.fillRect(p.x - 3, p.y - 3, 6, 6));
     }
 
     function handleMove(e) {
+        if (isDrawingMode && !isDrawing && polygonPoints.length > 0) {
+            drawPolygonDraft(getPointerPos(e));
+            return;
+        }
         if (!isDrawingMode || !isDrawing) return;
         e.preventDefault();
         const pos = getPointerPos(e);
@@ -123,22 +170,33 @@ document.addEventListener('DOMContentLoaded', () => {
         let x = Math.min(startX, endX);
         let y = Math.min(startY, endY);
 
-        if (w > 20 && h > 20) {
+        if (w > 20 && h > 20 && polygonPoints.length === 0) {
             // Persist
             const zoneName = `Zone ${zones.length + 1}`;
             await addZone(x, y, w, h, zoneName);
 
             // Exit drawing mode
-            isDrawingMode = false;
-            videoContainer.classList.remove('selecting');
-            videoContainer.style.cursor = "default";
-            btnAddZone.innerHTML = '<i class="fa-solid fa-plus"></i> Add Zone';
-            btnAddZone.classList.remove('active');
+            exitDrawingMode();
+        } else if (w <= 20 && h <= 20) {
+            // A click: add a polygon corner, or close the polygon on its first corner
+            const first = polygonPoints[0];
+            if (polygonPoints.length >= 3 && Math.hypot(endX - first.x, endY - first.y) < 12) {
+                await closePolygon();
+            } else {
+                polygonPoints.push({ x: endX, y: endY });
+                drawPolygonDraft();
+            }
         } else {
-            drawAllZones(); // Clear partial
+            drawPolygonDraft(); // Clear partial
         }
     }
 
+    async function closePolygon() {
+        if (polygonPoints.length < 3) return;
+        await addPolygonZone(polygonPoints, `Zone ${zones.length + 1}`);
+        exitDrawingMode();
+    }
+
     canvas.addEventListener('mousedown', handleStart);
     canvas.addEventListener('touchstart', handleStart, { passive: false });
 
@@ -147,13 +205,20 @@ document.addEventListener('DOMContentLoaded', () => {
 
     canvas.addEventListener('mouseup', handleEnd);
     canvas.addEventListener('touchend', handleEnd, { passive: false });
+    canvas.addEventListener('dblclick', (e) => {
+        if (!isDrawingMode) return;
+        e.preventDefault();
+        // Both clicks of the double-click added the same corner
+        polygonPoints.pop();
+        closePolygon();
+    });
 
     async function addZone(x, y, w, h, name) {
-        const scaleX = video.naturalWidth / video.clientWidth;
-        const scaleY = video.naturalHeight / video.clientHeight;
+        const scaleX = sourceWidth() / video.clientWidth;
+        const scaleY = sourceHeight() / video.clientHeight;
 
         try {
-            const response = await fetch('/api/set_roi', {
+            const response = await fetch(apiUrl('set_roi'), {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({
@@ -168,10 +233,27 @@ document.addEventListener('DOMContentLoaded', () => {
         } catch (e) { console.error(e); }
     }
 
+    async function addPolygonZone(points, name) {
+        const scaleX = sourceWidth() / video.clientWidth;
+        const scaleY = sourceHeight() / video.clientHeight;
+
+        try {
+            await fetch(apiUrl('set_roi'), {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    points: points.map(p => [Math.round(p.x * scaleX), Math.round(p.y * scaleY)]),
+                    name: name
+                })
+            });
+            await refreshZones();
+        } catch (e) { console.error(e); }
+    }
+
     window.deleteZone = async function (id) {
         // Removed confirmation per user request
         try {
-            await fetch('/api/delete_roi', {
+            await fetch(apiUrl('delete_roi'), {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({ id: id })
@@ -182,7 +264,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
     async function refreshZones() {
         try {
-            const res = await fetch('/api/get_rois');
+            const res = await fetch(apiUrl('get_rois'));
             zones = await res.json();
             renderZoneList();
             drawAllZones();
@@ -198,7 +280,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
         zoneList.innerHTML = zones.map(z => `
             <li class="zone-item">
-                <span><i class="fa-regular fa-square" style="color: #3b82f6"></i> ${z.name}</span>
+                <span><i class="${z.points ? 'fa-solid fa-draw-polygon' : 'fa-regular fa-square'}" style="color: #3b82f6"></i> ${z.name}</span>
                 <button onclick="deleteZone('${z.id}')" class="btn-icon danger" title="Remove"><i class="fa-solid fa-xmark"></i></button>
             </li>
         `).join('');
@@ -208,8 +290,8 @@ document.addEventListener('DOMContentLoaded', () => {
         ctx.clearRect(0, 0, canvas.width, canvas.height);
 
         // Scale back from video source to display
-        const scaleX = video.clientWidth / video.naturalWidth;
-        const scaleY = video.clientHeight / video.naturalHeight;
+        const scaleX = video.clientWidth / sourceWidth();
+        const scaleY = video.clientHeight / sourceHeight();
 
         zones.forEach(z => {
             const [zx, zy, zw, zh] = z.rect;
@@ -220,9 +302,20 @@ document.addEventListener('DOMContentLoaded', () => {
 
             ctx.strokeStyle = '#3b82f6';
             ctx.lineWidth = 2;
-            ctx.strokeRect(x, y, w, h);
             ctx.fillStyle = 'rgba(59, 130, 246, 0.1)';
-            ctx.fillRect(x, y, w, h);
+            if (z.points) {
+                ctx.beginPath();
+                z.points.forEach(([px, py], i) => {
+                    if (i === 0) ctx.moveTo(px * scaleX, py * scaleY);
+                    else ctx.lineTo(px * scaleX, py * scaleY);
+                });
+                ctx.closePath();
+                ctx.stroke();
+                ctx.fill();
+            } else {
+                ctx.strokeRect(x, y, w, h);
+                ctx.fillRect(x, y, w, h);
+            }
 
             ctx.fillStyle = '#3b82f6';
             ctx.font = "12px sans-serif";
@@ -260,7 +353,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({ status: status })
             });
-            // State will be updated by polling
+            // State will be updated by the status stream (or polling)
         } catch (e) { console.error(e); }
     }
 
@@ -268,7 +361,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
     btnToggleAway.addEventListener('click', () => {
         // Toggle happens via polling update, but we send the request
-        toggleFeature('/api/toggle_away', !awayMode);
+        toggleFeature(apiUrl('toggle_away'), !awayMode);
     });
 
     const btnToggleNight = document.getElementById('btnToggleNight');
@@ -289,13 +382,13 @@ document.addEventListener('DOMContentLoaded', () => {
     let weaponCheckEnabled = false;
 
     btnToggleNight.addEventListener('click', () => {
-        toggleFeature('/api/toggle_night_mode', !nightModeEnabled);
+        toggleFeature(apiUrl('toggle_night_mode'), !nightModeEnabled);
     });
 
     const btnToggleWeapon = document.getElementById('btnToggleWeapon');
     if (btnToggleWeapon) {
         btnToggleWeapon.addEventListener('click', () => {
-            toggleFeature('/api/toggle_weapon_detection', !weaponCheckEnabled);
+            toggleFeature(apiUrl('toggle_weapon_detection'), !weaponCheckEnabled);
         });
     }
 
@@ -305,16 +398,18 @@ document.addEventListener('DOMContentLoaded', () => {
     // --- Polling ---
     async function getStatus() {
         try {
-            const res = await fetch('/api/status');
+            const res = await fetch(apiUrl('status'));
             return await res.json();
         } catch (e) { return null; }
     }
 
-    setInterval(async () => {
-        const status = await getStatus();
-        if (!status) return;
-
+    function applyStatus(status) {
         // Sync State Variables (CRITICAL for button logic)
+        if (status.frame_width && (status.frame_width !== frameWidth || status.frame_height !== frameHeight)) {
+            frameWidth = status.frame_width;
+            frameHeight = status.frame_height;
+            drawAllZones();
+        }
         awayMode = status.away_mode;
         nightModeEnabled = status.night_mode_enabled;
         weaponCheckEnabled = status.weapon_check_enabled;
@@ -380,5 +475,37 @@ document.addEventListener('DOMContentLoaded', () => {
                 systemStatusPill.className = "status-pill";
             }
         }
-    }, 1000);
+    }
+
+    // --- Live Updates ---
+    // Status and zone changes are pushed over Server-Sent Events. If the
+    // stream is unavailable we fall back to polling every second.
+    let pollTimer = null;
+
+    function startPolling() {
+        if (pollTimer) return;
+        pollTimer = setInterval(async () => {
+            const status = await getStatus();
+            if (status) applyStatus(status);
+        }, 1000);
+    }
+
+    function stopPolling() {
+        clearInterval(pollTimer);
+        pollTimer = null;
+    }
+
+    if (window.EventSource) {
+        const source = new EventSource(apiUrl('stream'));
+        source.addEventListener('open', stopPolling);
+        source.addEventListener('error', startPolling); // EventSource keeps retrying on its own
+        source.addEventListener('status', (e) => applyStatus(JSON.parse(e.data)));
+        source.addEventListener('rois', (e) => {
+            zones = JSON.parse(e.data);
+            renderZoneList();
+            drawAllZones();
+        });
+    } else {
+        startPolling();
+    }
 });
@@ -0,0 +1,119 @@
+import threading
+import time
+
+import cv2
+
+# Stream profiles for /video_feed?profile=<name>.
+# width: output width in pixels (0 = capture resolution, never upscaled)
+# quality: JPEG quality, max_fps: 0 = every frame
+STREAM_PROFILES = {
+    'full': {'width': 0, 'quality': 95, 'max_fps': 0},
+    'high': {'width': 1280, 'quality': 85, 'max_fps': 15},
+    'medium': {'width': 854, 'quality': 75, 'max_fps': 10},
+    'low': {'width': 480, 'quality': 60, 'max_fps': 5},
+}
+DEFAULT_PROFILE = 'full'
+
+
+class FrameBroadcaster(object):
+    """Holds the latest encoded frame and wakes up every waiting viewer.
+
+    The camera pipeline publishes each frame once; any number of
+    /video_feed streams wait on it without touching the camera or models.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.seq = 0
+        self.frame = None
+        self.closed = False
+
+    def publish(self, frame):
+        with self.condition:
+            self.seq += 1
+            self.frame = frame
+            self.condition.notify_all()
+
+    def wait(self, last_seq=0, timeout=1.0):
+        """Wait for a frame newer than last_seq.
+
+        Returns (seq, frame). frame is None if nothing new arrived
+        within the timeout; seq is None once the broadcaster is closed.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.seq != last_seq or self.closed, timeout)
+            if self.closed:
+                return None, None
+            if self.seq == last_seq:
+                return last_seq, None
+            return self.seq, self.frame
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+
+class StreamHub(object):
+    """One broadcaster per stream profile.
+
+    Each profile is encoded at most once per frame, however many viewers
+    share it, and not at all while it has no subscribers.
+    """
+
+    def __init__(self, profiles=None):
+        self.profiles = profiles or STREAM_PROFILES
+        self.broadcasters = {name: FrameBroadcaster() for name in self.profiles}
+        self.subscribers = {name: 0 for name in self.profiles}
+        self.last_publish = {name: 0 for name in self.profiles}
+        self.lock = threading.Lock()
+        self.buffers = {}
+
+    def subscribe(self, profile):
+        """Register a viewer. Raises KeyError for an unknown profile."""
+        broadcaster = self.broadcasters[profile]
+        with self.lock:
+            self.subscribers[profile] += 1
+        return broadcaster
+
+    def unsubscribe(self, profile):
+        with self.lock:
+            self.subscribers[profile] = max(0, self.subscribers[profile] - 1)
+
+    def encode(self, image, profile):
+        settings = self.profiles[profile]
+        h, w = image.shape[:2]
+        width = settings['width']
+        if width and w > width:
+            size = (width, max(1, int(round(h * width / float(w)))))
+            buf = self.buffers.get(profile)
+            if buf is None or buf.shape[:2] != (size[1], size[0]):
+                buf = self.buffers[profile] = image[:size[1], :size[0]].copy()
+            image = cv2.resize(image, size, dst=buf, interpolation=cv2.INTER_AREA)
+        ret, jpeg = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, settings['quality']])
+        return jpeg.tobytes()
+
+    def publish(self, image, required=()):
+        """Encode image for every profile that is due and has viewers.
+
+        Profiles in required (e.g. the clip recorder's) are encoded even
+        without viewers, but like every profile only at its max_fps.
+        Returns {profile: jpeg bytes} for everything encoded this frame.
+        """
+        now = time.monotonic()
+        with self.lock:
+            wanted = [name for name, count in self.subscribers.items() if count > 0]
+        encoded = {}
+        for name in set(wanted) | set(required):
+            max_fps = self.profiles[name]['max_fps']
+            if max_fps and now - self.last_publish[name] < 1.0 / max_fps:
+                continue
+            self.last_publish[name] = now
+            encoded[name] = self.encode(image, name)
+            if name in wanted:
+                self.broadcasters[name].publish(encoded[name])
+        return encoded
+
+    def close(self):
+        for broadcaster in self.broadcasters.values():
+            broadcaster.close()
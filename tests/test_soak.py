@@ -0,0 +1,140 @@
+"""Soak test: a long-running camera must not grow its memory.
+
+Drives VideoCamera.get_frame() through a few thousand frames with a fake
+capture and fake detectors that report a person and a weapon on every
+frame, and checks that Python/numpy allocations and resident memory stay
+flat and the detection buffers stay bounded.
+"""
+import gc
+import os
+import sys
+import tracemalloc
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# camera imports the real model libraries even though the test never loads a model
+pytest.importorskip('ultralytics')
+pytest.importorskip('face_recognition')
+
+from camera import MAX_WEAPON_BOXES, VideoCamera
+from faces import FaceIndex
+
+WIDTH, HEIGHT = 640, 480
+WARMUP_FRAMES = 300
+SOAK_FRAMES = 3000
+MAX_TRACED_GROWTH_MB = 1.0
+MAX_RSS_GROWTH_MB = 8.0
+
+
+class FakeCapture(object):
+    """A bright box walking across a dark frame, forever."""
+
+    def __init__(self):
+        self.count = 0
+
+    def read(self, image=None):
+        if image is None:
+            image = np.empty((HEIGHT, WIDTH, 3), dtype=np.uint8)
+        image.fill(60)
+        x = (self.count * 9) % (WIDTH - 100)
+        image[100:400, x:x + 100] = 240
+        self.count += 1
+        return True, image
+
+    def isOpened(self):
+        return True
+
+    def release(self):
+        pass
+
+
+class FakeTensor(object):
+    def __init__(self, values):
+        self.values = np.array(values, dtype=np.float32)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.values
+
+
+class FakeBox(object):
+    def __init__(self, xyxy, conf):
+        self.xyxy = [FakeTensor(xyxy)]
+        self.conf = np.array([conf], dtype=np.float32)
+
+
+class FakeResult(object):
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+class FakeModels(object):
+    """SharedModels stand-in: one centred detection per image, no faces."""
+
+    def __init__(self):
+        self.face_index = FaceIndex([], [])
+
+    @staticmethod
+    def _detect(images):
+        results = []
+        for image in images:
+            h, w = image.shape[:2]
+            results.append(FakeResult([FakeBox((w * 0.25, h * 0.25, w * 0.75, h * 0.75), 0.9)]))
+        return results
+
+    def detect_persons(self, images, **kwargs):
+        return self._detect(images)
+
+    def detect_weapons(self, images, **kwargs):
+        return self._detect(images)
+
+    def encode_faces(self, rgb_image):
+        return []
+
+
+def rss_mb():
+    """Resident set size (Linux only), or None."""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE') / (1024.0 * 1024.0)
+
+
+def test_memory_stays_flat():
+    camera = VideoCamera('soak', FakeCapture(), models=FakeModels(), record_clips=False)
+    try:
+        assert camera.get_frame() is not None
+        camera.add_roi(0, 0, WIDTH, HEIGHT, "Soak")
+        camera.toggle_away_mode(True)
+        camera.toggle_weapon_detection(True)
+        for _ in range(WARMUP_FRAMES):
+            camera.get_frame()
+
+        gc.collect()
+        tracemalloc.start()
+        traced_start, _ = tracemalloc.get_traced_memory()
+        rss_start = rss_mb()
+        for _ in range(SOAK_FRAMES):
+            assert camera.get_frame() is not None
+        gc.collect()
+        traced_end, _ = tracemalloc.get_traced_memory()
+        rss_end = rss_mb()
+        tracemalloc.stop()
+
+        # Weapons were reported on every scanned frame, so an unbounded buffer would be full
+        assert len(camera.confirmed_weapon_boxes) == MAX_WEAPON_BOXES
+        assert camera.weapon_active
+
+        traced_growth = (traced_end - traced_start) / (1024.0 * 1024.0)
+        assert traced_growth < MAX_TRACED_GROWTH_MB, f"traced memory grew {traced_growth:.2f} MB"
+        if rss_start is not None:
+            assert rss_end - rss_start < MAX_RSS_GROWTH_MB, f"RSS grew {rss_end - rss_start:.1f} MB"
+    finally:
+        camera.stop()
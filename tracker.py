@@ -0,0 +1,126 @@
+"""Lightweight multi-object tracker (SORT style, CPU only).
+
+Each detection box is matched to an existing track by IoU against the
+track's predicted position. A simple constant-velocity filter smooths the
+box between frames. Tracks carry a cached identity verdict so face
+recognition only has to run once per person, not once per frame.
+"""
+import itertools
+
+import numpy as np
+
+from zones import box_iou
+
+
+class Track(object):
+    """A single tracked person."""
+
+    def __init__(self, track_id, box, now):
+        self.id = track_id
+        self.box = np.array(box, dtype=np.float32)
+        self.velocity = np.zeros(4, dtype=np.float32)
+        self.last_update = now
+
+        # Identity cache
+        self.known = None # None = not verified yet
+        self.name = None
+        self.distance = None
+        self.verified_at = None # when the cached verdict was made
+        self.checked_at = None # last face check, with or without a verdict
+        self.had_face = False
+        self.faceless = False # last check saw no face and kept the verdict
+
+    def predict(self, now):
+        """Box position extrapolated to now with the current velocity."""
+        dt = now - self.last_update
+        return self.box + self.velocity * dt
+
+    def update(self, box, now, alpha=0.6, beta=0.3):
+        """Alpha-beta update: a fixed-gain Kalman filter on box corners and velocity."""
+        dt = max(now - self.last_update, 1e-3)
+        predicted = self.box + self.velocity * dt
+        residual = np.asarray(box, dtype=np.float32) - predicted
+        self.box = predicted + alpha * residual
+        self.velocity = self.velocity + (beta / dt) * residual
+        self.last_update = now
+
+    def int_box(self):
+        return tuple(int(v) for v in self.box)
+
+    def set_identity(self, known, name, distance, had_face, now):
+        self.known = known
+        self.name = name
+        self.distance = distance
+        self.had_face = had_face
+        self.verified_at = now
+        self.checked_at = now
+        self.faceless = False
+
+    def keep_identity(self, now, max_known_age=10.0):
+        """Record a check that saw no face while a face-backed verdict is cached.
+
+        The verdict is kept (the person may just have turned away) but
+        retried like a low-confidence one. A "known" verdict whose face is
+        older than max_known_age goes back to unknown, so a track taken
+        over by someone hiding their face does not stay authorized.
+        """
+        if self.known and now - self.verified_at > max_known_age:
+            self.set_identity(False, None, None, False, now)
+            return
+        self.checked_at = now
+        self.faceless = True
+
+    def needs_verification(self, now, reverify_interval=5.0, retry_interval=0.5):
+        """Whether face recognition should run for this track now.
+
+        Known/unknown verdicts backed by a face are trusted until
+        reverify_interval has passed. Verdicts without a visible face
+        (low confidence) are retried every retry_interval.
+        """
+        if self.checked_at is None:
+            return True
+        interval = reverify_interval if self.had_face and not self.faceless else retry_interval
+        return now - self.checked_at >= interval
+
+
+class PersonTracker(object):
+    """Greedy IoU tracker handing out stable track IDs."""
+
+    def __init__(self, iou_threshold=0.3, max_age=1.5):
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age # seconds a track survives without a match
+        self.tracks = []
+        self._ids = itertools.count(1)
+
+    def update(self, boxes, now):
+        """Match detections to tracks.
+
+        boxes: [(x1, y1, x2, y2)]. Returns a list of Tracks, one per input
+        box and in the same order.
+        """
+        predicted = [t.predict(now) for t in self.tracks]
+        pairs = []
+        for d, box in enumerate(boxes):
+            for t, pbox in enumerate(predicted):
+                iou = box_iou(box, pbox)
+                if iou >= self.iou_threshold:
+                    pairs.append((iou, d, t))
+        pairs.sort(reverse=True)
+
+        assigned = [None] * len(boxes)
+        used_tracks = set()
+        for iou, d, t in pairs:
+            if assigned[d] is not None or t in used_tracks:
+                continue
+            self.tracks[t].update(boxes[d], now)
+            assigned[d] = self.tracks[t]
+            used_tracks.add(t)
+
+        for d, box in enumerate(boxes):
+            if assigned[d] is None:
+                track = Track(next(self._ids), box, now)
+                self.tracks.append(track)
+                assigned[d] = track
+
+        self.tracks = [t for t in self.tracks if now - t.last_update <= self.max_age]
+        return assigned
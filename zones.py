@@ -0,0 +1,178 @@
+"""Geometry helpers for ROI zones and detection boxes.
+
+Rects are (x, y, w, h) like the ROIs stored on VideoCamera; detection
+boxes are (x1, y1, x2, y2) like YOLO's xyxy output. Polygon ROIs are
+rasterized once into Zone objects, which answer motion and overlap
+queries from integral images.
+"""
+import cv2
+import numpy as np
+
+
+def clip_rect(rect, width, height):
+    """Clip an (x, y, w, h) rect to the image. Returns None if nothing is left."""
+    x, y, w, h = rect
+    x = max(0, min(x, width))
+    y = max(0, min(y, height))
+    w = max(0, min(w, width - x))
+    h = max(0, min(h, height - y))
+    if w <= 0 or h <= 0:
+        return None
+    return (x, y, w, h)
+
+
+def rect_to_box(rect):
+    x, y, w, h = rect
+    return (x, y, x + w, y + h)
+
+
+def box_area(box):
+    x1, y1, x2, y2 = box
+    return max(0, x2 - x1) * max(0, y2 - y1)
+
+
+def box_intersection(a, b):
+    """Intersection of two xyxy boxes, or None if they do not overlap."""
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    if x2 <= x1 or y2 <= y1:
+        return None
+    return (x1, y1, x2, y2)
+
+
+def box_iou(a, b):
+    inter = box_intersection(a, b)
+    if inter is None:
+        return 0.0
+    inter_area = box_area(inter)
+    return inter_area / float(box_area(a) + box_area(b) - inter_area)
+
+
+def merge_rects(rects, max_slack=1.5):
+    """Merge overlapping (x, y, w, h) rects into their bounding rects.
+
+    Two rects are only merged when the bounding rect is not much larger
+    than the area they actually cover (max_slack), so an L-shaped pair of
+    zones does not turn into one huge crop.
+    """
+    boxes = [rect_to_box(r) for r in rects]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                a, b = boxes[i], boxes[j]
+                inter = box_intersection(a, b)
+                if inter is None:
+                    continue
+                union = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                covered = box_area(a) + box_area(b) - box_area(inter)
+                if box_area(union) <= max_slack * covered:
+                    boxes[i] = union
+                    del boxes[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return [(x1, y1, x2 - x1, y2 - y1) for (x1, y1, x2, y2) in boxes]
+
+
+def dedupe_boxes(scored_boxes, iou_threshold=0.5):
+    """Greedy NMS over [(box, score)]. Keeps the highest scoring box of each overlapping group."""
+    kept = []
+    for box, score in sorted(scored_boxes, key=lambda b: b[1], reverse=True):
+        if all(box_iou(box, k) < iou_threshold for k, _ in kept):
+            kept.append((box, score))
+    return kept
+
+
+def pad_box(box, pad, width, height):
+    """Grow an xyxy box by pad times its size on every side, clipped to the image."""
+    x1, y1, x2, y2 = box
+    dx, dy = int((x2 - x1) * pad), int((y2 - y1) * pad)
+    return (max(0, x1 - dx), max(0, y1 - dy), min(width, x2 + dx), min(height, y2 + dy))
+
+
+def tile_rects(width, height, tile, overlap=0.15):
+    """Cover the image with tile x tile (x, y, w, h) rects overlapping by a fraction.
+
+    Tiles are spread evenly, so the overlap is at least the given fraction;
+    objects cut by one tile edge are whole in the neighbouring tile.
+    """
+    def starts(size):
+        if size <= tile:
+            return [0]
+        count = -(-(size - tile) // int(tile * (1 - overlap))) + 1 # ceil
+        return [round(i * (size - tile) / (count - 1)) for i in range(count)]
+    return [(x, y, min(tile, width), min(tile, height)) for y in starts(height) for x in starts(width)]
+
+
+def integral_sum(integral, box):
+    """Sum of the pixels inside an xyxy box, from an integral image (cv2.integral). O(1)."""
+    h, w = integral.shape[0] - 1, integral.shape[1] - 1
+    x1, y1 = max(0, min(box[0], w)), max(0, min(box[1], h))
+    x2, y2 = max(x1, min(box[2], w)), max(y1, min(box[3], h))
+    return int(integral[y2, x2]) - int(integral[y1, x2]) - int(integral[y2, x1]) + int(integral[y1, x1])
+
+
+class Zone(object):
+    """One ROI rasterized at analysis resolution.
+
+    Built once per ROI change. Rect zones answer motion queries with four
+    lookups in the frame's motion integral; polygons add up their row
+    spans (one vectorized lookup per row). Box overlap uses the zone's own
+    integral, so both stay cheap with many zones and boxes.
+    """
+
+    def __init__(self, roi, frame_size, analysis_size, scale):
+        self.roi = roi
+        width, height = frame_size
+        # Full-resolution bounding rect (for crops), clipped to the frame
+        self.rect = clip_rect(roi['rect'], width, height)
+        self.box = rect_to_box(self.rect) if self.rect else None
+
+        # Shape in analysis pixels, filled into a mask covering its bounding box
+        aw, ah = analysis_size
+        self.is_rect = not roi.get('points')
+        if self.is_rect:
+            x, y, w, h = roi['rect']
+            bounds = (int(x * scale), int(y * scale), int(np.ceil((x + w) * scale)), int(np.ceil((y + h) * scale)))
+        else:
+            points = np.round(np.array(roi['points'], dtype=np.float64) * scale).astype(np.int32)
+            bounds = (points[:, 0].min(), points[:, 1].min(), points[:, 0].max() + 1, points[:, 1].max() + 1)
+        x1, y1 = max(0, min(int(bounds[0]), aw)), max(0, min(int(bounds[1]), ah))
+        x2, y2 = max(x1, min(int(bounds[2]), aw)), max(y1, min(int(bounds[3]), ah))
+        self.analysis_box = (x1, y1, x2, y2)
+        if self.is_rect:
+            mask = np.ones((y2 - y1, x2 - x1), dtype=np.uint8)
+        else:
+            mask = np.zeros((y2 - y1, x2 - x1), dtype=np.uint8)
+            # Empty when the polygon lies outside the frame (e.g. after a resolution drop)
+            if x2 > x1 and y2 > y1:
+                cv2.fillPoly(mask, [points - (x1, y1)], 1)
+        self.integral = cv2.integral(mask, sdepth=cv2.CV_32S)
+        self.area = int(self.integral[-1, -1])
+
+        # Horizontal runs of the mask: start/end columns per row, frame coordinates
+        edges = np.diff(np.pad(mask, ((0, 0), (1, 1))).astype(np.int8), axis=1)
+        rows, starts = np.nonzero(edges == 1)
+        _, ends = np.nonzero(edges == -1)
+        self.span_rows = rows + y1
+        self.span_x1 = starts + x1
+        self.span_x2 = ends + x1
+
+    def motion_pixels(self, motion_integral):
+        """Moving pixels inside the zone, given the integral of a 0/1 motion mask."""
+        if self.is_rect:
+            return integral_sum(motion_integral, self.analysis_box)
+        I, r = motion_integral, self.span_rows
+        return int((I[r + 1, self.span_x2] - I[r, self.span_x2] - I[r + 1, self.span_x1] + I[r, self.span_x1]).sum())
+
+    def motion_ratio(self, motion_integral):
+        return self.motion_pixels(motion_integral) / float(self.area) if self.area else 0.0
+
+    def overlap(self, analysis_box):
+        """Zone pixels inside an xyxy box in analysis coordinates."""
+        ox, oy = self.analysis_box[:2]
+        x1, y1, x2, y2 = analysis_box
+        return integral_sum(self.integral, (x1 - ox, y1 - oy, x2 - ox, y2 - oy))